@@ -0,0 +1,507 @@
+"""The aigf chat app; storage, speech and memory are capabilities switched on per deployment
+
+aigf.py, aigf_cloud.py, aigf_speech.py and aigf_prod.py each run this app with
+one of CONFIGS. Run it directly to pick the configuration from the environment:
+
+    AIGF_MODE=aigf_speech streamlit run aigf_app.py
+    AIGF_MODE=aigf_prod AIGF_MEMORY=0 streamlit run aigf_app.py
+"""
+import os
+import re
+from datetime import datetime
+from typing import Dict, List
+
+import streamlit as st
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from chat_storage import CloudChatStorage, get_storage, search_terms
+from core import get_secret
+from fast_path import canned_reply
+from llm_scheduler import scheduled_client
+from memory import get_memory, format_memories
+from message_writer import PendingMessage, get_writer
+from model_router import get_router
+from persona import DEFAULT_PERSONA, get_personality, get_system_prompt, list_personas, persona_label
+from session_manager import track_session
+from speech import speak_message, warm_canned_audio
+from tracing import TurnTrace, finish_trace, render_debug_panel
+from transcript import Transcript
+from turn_engine import start_turn, follow_turn, end_turn
+from warmup import warm_process, prefetch, take_prefetched, prime_prompt_cache, cached_system
+
+# Load environment variables (works both locally and in cloud)
+load_dotenv()
+
+
+class AppConfig:
+    """Which capabilities one deployment of the app turns on"""
+    FLAGS = ("storage", "speech", "memory", "cached_listing", "allow_invalid_certificates")
+    __slots__ = ("name",) + FLAGS
+
+    def __init__(self, name: str, storage: bool = True, speech: bool = True, memory: bool = True,
+                 cached_listing: bool = True, allow_invalid_certificates: bool = False):
+        self.name = name
+        # Conversations kept in MongoDB, with the history sidebar and search
+        self.storage = storage
+        # Replies read aloud with ElevenLabs
+        self.speech = speech
+        # Related snippets of past conversations recalled into the prompt
+        self.memory = memory
+        # Sidebar listing served from the shared cache rather than queried on every load
+        self.cached_listing = cached_listing
+        # Skip TLS certificate verification for MongoDB (only for servers with self-signed certificates)
+        self.allow_invalid_certificates = allow_invalid_certificates
+
+    def replace(self, **changes) -> "AppConfig":
+        values = {flag: getattr(self, flag) for flag in self.FLAGS}
+        values.update(changes)
+        return AppConfig(self.name, **values)
+
+    def __repr__(self) -> str:
+        flags = ", ".join(f"{flag}={getattr(self, flag)}" for flag in self.FLAGS)
+        return f"AppConfig({self.name}, {flags})"
+
+
+# The four deployments that used to be separate scripts
+CONFIGS = {
+    "aigf": AppConfig("aigf", storage=False, speech=False, memory=False),
+    "aigf_cloud": AppConfig("aigf_cloud", speech=False, memory=False, cached_listing=False,
+                            allow_invalid_certificates=True),
+    "aigf_speech": AppConfig("aigf_speech", memory=False, cached_listing=False,
+                             allow_invalid_certificates=True),
+    "aigf_prod": AppConfig("aigf_prod"),
+}
+
+
+def config_from_env() -> AppConfig:
+    """CONFIGS[AIGF_MODE], with any flag overridden by AIGF_<FLAG>=0/1"""
+    config = CONFIGS[os.getenv("AIGF_MODE", "aigf_prod")]
+    overrides = {
+        flag: os.getenv(f"AIGF_{flag.upper()}") == "1"
+        for flag in AppConfig.FLAGS
+        if os.getenv(f"AIGF_{flag.upper()}") is not None
+    }
+    return config.replace(**overrides)
+
+
+# Heavy objects are shared by all sessions instead of living in session state
+@st.cache_resource
+def get_client():
+    """Anthropic client shared across sessions, rate limited by the process-wide scheduler"""
+    return scheduled_client(get_secret("ANTHROPIC_API_KEY"))
+
+
+def storage(config: AppConfig) -> CloudChatStorage:
+    return get_storage(config.cached_listing, config.allow_invalid_certificates)
+
+
+def highlight_snippet(content: str, terms: List[str], width: int = 120) -> str:
+    """Markdown snippet of `content` around the first match with the terms in bold"""
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    match = pattern.search(content)
+    start = max(0, match.start() - width // 3) if match else 0
+    snippet = content[start:start + width]
+    snippet = pattern.sub(lambda m: f"**{m.group(0)}**", snippet)
+    return ('…' if start else '') + snippet + ('…' if start + width < len(content) else '')
+
+
+def render_search_results(config: AppConfig, query: str, page_size: int = 5):
+    """Paginated search results with highlighted snippets, shown in the sidebar"""
+    if st.session_state.get('search_for') != query:
+        st.session_state.search_for = query
+        st.session_state.search_page = 0
+    page = st.session_state.search_page
+
+    try:
+        results, has_more = storage(config).search_conversations(query, page, page_size)
+    except Exception as e:
+        st.error(f"Search failed: {str(e)}")
+        return
+    if not results:
+        st.write("No matching conversations.")
+        return
+
+    terms = search_terms(query)
+    for result in results:
+        timestamp = result['timestamp'].strftime("%Y-%m-%d %H:%M")
+        if st.button(f"🔎 {timestamp}", key=f"search_{str(result['_id'])}"):
+            open_conversation(config, result)
+            st.rerun()
+        for message in result.get('matches', []):
+            st.markdown(f"{message['role']}: {highlight_snippet(message['content'], terms)}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if page > 0 and st.button("◀ Prev", key="search_prev"):
+            st.session_state.search_page = page - 1
+            st.rerun()
+    with col2:
+        if has_more and st.button("Next ▶", key="search_next"):
+            st.session_state.search_page = page + 1
+            st.rerun()
+
+
+def switch_persona(persona: str):
+    st.session_state.persona = persona
+    st.session_state.personality = get_personality(persona)
+
+
+def new_conversation_id(config: AppConfig):
+    """ID for a new conversation; with storage it is only written once it has a message"""
+    return storage(config).start_conversation() if config.storage else ObjectId()
+
+
+def new_conversation(config: AppConfig):
+    st.session_state.messages = Transcript()
+    st.session_state.conversation_id = new_conversation_id(config)
+
+
+def load_history(config: AppConfig, conversation_id) -> Transcript:
+    """A conversation's stored messages followed by any still being saved in the background"""
+    history = storage(config).get_conversation_history(conversation_id)
+    return Transcript(get_writer().with_pending(conversation_id, history))
+
+
+def open_conversation(config: AppConfig, conversation: Dict):
+    """Load a stored conversation, along with the persona it was had with"""
+    st.session_state.messages = load_history(config, conversation['_id'])
+    st.session_state.conversation_id = conversation['_id']
+    persona = conversation.get('persona', DEFAULT_PERSONA)
+    if persona != st.session_state.persona and persona in list_personas():
+        switch_persona(persona)
+
+
+def init_chat(config: AppConfig):
+    """Initialize chat history and settings in session state"""
+    # Without storage an idle session's transcript can only come back from a spill file
+    track_session(config.name, spill=not config.storage)
+    if "persona" not in st.session_state:
+        st.session_state.persona = DEFAULT_PERSONA
+    if "personality" not in st.session_state:
+        st.session_state.personality = get_personality(st.session_state.persona)
+    if "messages" not in st.session_state:
+        if "conversation_id" in st.session_state and config.storage:
+            # Transcript was evicted while the session sat idle; reload it from storage
+            st.session_state.messages = load_history(config, st.session_state.conversation_id)
+        else:
+            st.session_state.messages = Transcript()
+    if "conversation_id" not in st.session_state:
+        st.session_state.conversation_id = new_conversation_id(config)
+
+
+def warm_session(config: AppConfig):
+    """Start warm-up in the background so the first turn is as fast as later ones"""
+    tasks = {"client": get_client}
+    if config.storage:
+        tasks["storage"] = lambda: storage(config)
+    if config.memory:
+        tasks["memory"] = get_memory
+    warm_process(tasks)
+    if config.storage and 'conversation_list' not in st.session_state:
+        prefetch("conversation_list", lambda: storage(config).get_recent_conversations())
+
+
+def warm_persona(config: AppConfig, persona: str):
+    """Prime the prompt cache and canned audio for a persona once someone uses it"""
+    if config.speech:
+        warm_process({f"canned_audio:{persona}": lambda: warm_canned_audio(persona)})
+    prime_prompt_cache(get_client, get_system_prompt(persona))
+
+
+def select_persona(config: AppConfig):
+    """Persona picker; choosing another persona starts a new conversation with them"""
+    personas = list_personas()
+    current = st.session_state.persona
+    selected = st.sidebar.selectbox(
+        "Chat with",
+        personas,
+        index=personas.index(current) if current in personas else 0,
+        format_func=persona_label
+    )
+    if selected and selected != current:
+        switch_persona(selected)
+        new_conversation(config)
+
+
+def save_message(config: AppConfig, conversation_id, role: str, content: str, persona: str):
+    """Queue a message to be stored and indexed for recall, as far as the config keeps either
+
+    The transcript already has it; the write happens in the background and is
+    retried, so a slow database never holds up the turn.
+    """
+    if not (config.storage or config.memory):
+        return
+
+    def save(message: PendingMessage):
+        if config.storage:
+            storage(config).save_message(message.conversation_id, message.role, message.content,
+                                         message.persona, message.id, message.timestamp)
+        if config.memory:
+            get_memory().add(message.conversation_id, message.role, message.content, message.persona)
+
+    get_writer().submit(PendingMessage(conversation_id, role, content, persona, save))
+
+
+def render_save_status(config: AppConfig):
+    """Small indicator of whether the current conversation has reached the database"""
+    conversation_id = st.session_state.conversation_id
+    status = get_writer().status(conversation_id)
+    if status["state"] == "saved":
+        if st.session_state.messages:
+            st.caption("☁️ Saved")
+    elif status["state"] == "saving":
+        st.caption("⏳ Saving…")
+    elif status["state"] == "retrying":
+        st.caption(f"⏳ Database is slow, retrying ({status['pending']} unsaved)")
+    elif status["state"] == "discarded":
+        st.caption(f"🗑️ Conversation deleted; {status['dropped']} messages not saved")
+    else:
+        st.caption(f"⚠️ {status['pending']} messages not saved yet: {status['error']}")
+        if st.button("Retry saving", key="retry_save"):
+            get_writer().retry(conversation_id)
+            st.rerun()
+
+
+def send_canned_reply(config: AppConfig, reply: str, trace):
+    """Answer from the personality's own lines, without an LLM call"""
+    trace.route = "canned"
+    trace.count("fast_path")
+    with st.chat_message("assistant"):
+        st.write(reply)
+        if config.speech:
+            with trace.span("tts"):
+                speak_message(reply, st.session_state.persona, trace)
+    st.session_state.messages.add("assistant", reply)
+    with trace.span("queue_message"):
+        save_message(config, st.session_state.conversation_id, "assistant", reply, st.session_state.persona)
+    finish_trace(trace)
+
+
+def complete_turn(config: AppConfig, turn):
+    """Show a background reply as it streams, then add it to the chat and speak it"""
+    if turn.conversation_id != st.session_state.conversation_id:
+        # The user switched conversations; the reply is still saved to its own one
+        if turn.done:
+            end_turn(turn)
+            finish_trace(turn.trace)
+        return
+
+    with st.chat_message("assistant"):
+        try:
+            assistant_message = follow_turn(turn, st.empty())
+            st.session_state.messages.add("assistant", assistant_message)
+
+            # Generate and play TTS for the assistant's message
+            if config.speech:
+                with turn.trace.span("tts"):
+                    speak_message(assistant_message, st.session_state.persona, turn.trace)
+        except Exception as e:
+            turn.trace.error = str(e)
+            st.error(f"Error: {str(e)}")
+    # Not in a finally: a rerun interrupting follow_turn must leave the turn active
+    end_turn(turn)
+    finish_trace(turn.trace)
+
+
+def render_conversation_list(config: AppConfig):
+    """Stored conversations with search, open and delete, in the sidebar"""
+    st.header("Previous Conversations")
+
+    # Full-text search across stored messages
+    search_query = st.text_input("Search conversations", key="search_query")
+    if search_query.strip():
+        render_search_results(config, search_query.strip())
+        st.markdown("---")
+
+    # Clear all conversations button
+    if st.button("Clear All Conversations", type="secondary"):
+        if st.session_state.get('show_clear_confirm', False):
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Yes, Clear All", type="primary"):
+                    # Only this session's conversations: other sessions keep saving theirs
+                    get_writer().discard(st.session_state.conversation_id,
+                                         *(c['_id'] for c in st.session_state.get('conversation_list', [])))
+                    deleted = storage(config).clear_all_conversations()
+                    if config.memory:
+                        get_memory().clear()
+                    st.session_state.conversation_list = []  # Clear the list in UI
+                    new_conversation(config)  # Clear current messages
+                    st.session_state.show_clear_confirm = False
+                    st.success(f"Cleared {deleted} conversations")
+            with col2:
+                if st.button("Cancel"):
+                    st.session_state.show_clear_confirm = False
+        else:
+            st.session_state.show_clear_confirm = True
+
+    # Create a scrollable container for conversation history
+    with st.container():
+        for convo in st.session_state.conversation_list:
+            timestamp = convo['timestamp'].strftime("%Y-%m-%d %H:%M")
+            col1, col2 = st.columns([4, 1])
+
+            with col1:
+                label = persona_label(convo.get('persona', DEFAULT_PERSONA))
+                if st.button(f"📝 {timestamp} · {label}", key=f"convo_{str(convo['_id'])}"):
+                    open_conversation(config, convo)
+                    st.rerun()  # Add this to refresh the chat immediately
+
+            with col2:
+                # Simplified delete button - single click
+                if st.button("🗑️", key=f"del_{str(convo['_id'])}"):
+                    # Delete from database, along with any messages still waiting to be saved
+                    get_writer().discard(convo['_id'])
+                    storage(config).delete_conversation(convo['_id'])
+                    if config.memory:
+                        get_memory().forget(convo['_id'])
+
+                    # Update UI immediately
+                    st.session_state.conversation_list = [
+                        c for c in st.session_state.conversation_list
+                        if c['_id'] != convo['_id']
+                    ]
+
+                    # Reset current chat if deleted
+                    if st.session_state.conversation_id == convo['_id']:
+                        new_conversation(config)
+
+                    st.rerun()  # Refresh the page to show changes
+
+    # Update conversation list when new messages are added
+    if st.session_state.get('update_conversations', False):
+        st.session_state.conversation_list = list(storage(config).get_recent_conversations())
+        st.session_state.update_conversations = False
+
+    # Add some spacing before personality info
+    st.markdown("---")
+
+
+def main(config: AppConfig):
+    warm_session(config)
+    init_chat(config)
+    select_persona(config)
+    name = persona_label(st.session_state.persona)
+    if st.session_state.personality:
+        warm_persona(config, st.session_state.persona)
+        name = st.session_state.personality["basic_info"].get("name", name)
+    st.title(f"Chat with {name}")
+
+    # Initialize conversation list with caching
+    if config.storage and 'conversation_list' not in st.session_state:
+        st.session_state.conversation_list = take_prefetched(
+            "conversation_list", lambda: storage(config).get_recent_conversations()
+        )
+
+    # Sidebar with conversation history
+    with st.sidebar:
+        if config.storage:
+            render_save_status(config)
+            render_conversation_list(config)
+
+        # Collapsible personality info
+        with st.expander(f"{name}'s Profile", expanded=False):
+            if st.session_state.personality:
+                st.write("Basic Info:")
+                for key, value in st.session_state.personality["basic_info"].items():
+                    st.write(f"- {key}: {value}")
+
+                st.write("\nTraits:")
+                for trait in st.session_state.personality["traits"]:
+                    st.write(f"- {trait}")
+
+                st.write("\nLove Languages:")
+                st.write("Giving:")
+                for giving in st.session_state.personality["love_languages"]["giving"]:
+                    st.write(f"- {giving}")
+
+                st.write("\nReceiving:")
+                for receiving in st.session_state.personality["love_languages"]["receiving"]:
+                    st.write(f"- {receiving}")
+
+    if st.session_state.personality is None:
+        st.info(f"Please make sure personas/{st.session_state.persona} exists")
+        return
+
+    # Display chat messages
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.write(message["content"])
+
+    # Chat input
+    prompt = st.chat_input("Type your message...")
+
+    # A reply still generating from an earlier run (interrupted by a click or a
+    # new message) is picked up where it is instead of being requested again
+    if "active_turn" in st.session_state:
+        complete_turn(config, st.session_state.active_turn)
+
+    if prompt:
+        trace = TurnTrace(config.name, st.session_state.conversation_id)
+        conversation_id = st.session_state.conversation_id
+        persona = st.session_state.persona
+
+        # Opening greetings and plain statements of mood are answered instantly from the personality's
+        # own lines; anything the classifier is unsure about goes to the LLM
+        history = st.session_state.messages
+        previous = history[-1]["content"] if history and history[-1]["role"] == "assistant" else None
+        canned = canned_reply(prompt, st.session_state.personality, previous)
+
+        memories = []
+        if canned is None and config.memory:
+            # Recall related moments from earlier conversations before indexing this one
+            with trace.span("memory"):
+                memories = get_memory().search(prompt, exclude_conversation=conversation_id, persona=persona)
+            trace.count("memories_recalled", len(memories))
+
+        # Add user message
+        st.session_state.messages.add("user", prompt)
+        with trace.span("queue_message"):
+            save_message(config, conversation_id, "user", prompt, persona)
+
+        # A new conversation is stored with its first message; list it without re-querying
+        if config.storage and len(st.session_state.messages) == 1:
+            st.session_state.conversation_list.insert(
+                0, {'_id': conversation_id, 'timestamp': datetime.now(), 'persona': persona}
+            )
+
+        with st.chat_message("user"):
+            st.write(prompt)
+
+        if canned is not None:
+            send_canned_reply(config, canned, trace)
+        else:
+            # Small talk goes to the fast model; the heavy model is kept for turns that need it
+            route = get_router().route(prompt, len(st.session_state.messages) - 1)
+            trace.route = route.name
+
+            # Get AI response
+            with trace.span("prompt_build"):
+                # The persona prompt is the cached prefix; recalled memories change every turn
+                system = cached_system(route.model, get_system_prompt(persona), format_memories(memories).strip())
+                messages = st.session_state.messages.to_api()
+            trace.count("system_chars", sum(len(block["text"]) for block in system))
+            trace.count("history_chars", sum(len(message["content"]) for message in messages))
+
+            def save_reply(assistant_message: str):
+                save_message(config, conversation_id, "assistant", assistant_message, persona)
+
+            # Generation runs in the background; this run only renders it
+            turn = start_turn(
+                get_client(),
+                trace,
+                save_reply,
+                conversation_id=conversation_id,
+                model=route.model,
+                max_tokens=1024,
+                system=system,
+                messages=messages
+            )
+            complete_turn(config, turn)
+
+    render_debug_panel()
+
+
+if __name__ == "__main__":
+    main(config_from_env())
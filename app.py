@@ -1,11 +1,16 @@
 from dotenv import load_dotenv
-import anthropic
 import streamlit as st
+from llm_scheduler import scheduled_client
 
 load_dotenv()
 
+@st.cache_resource
+def get_client():
+    """Anthropic client shared across sessions, rate limited by the process-wide scheduler"""
+    return scheduled_client()
+
 def get_response(user_input):
-    client = anthropic.Anthropic()
+    client = get_client()
     response = client.messages.create(
         model="claude-3-5-sonnet-20240620",
         max_tokens=1024,
@@ -0,0 +1,164 @@
+"""Streaming export/import of stored conversations as gzip JSONL.
+
+Documents are read with a batched cursor and written one per line in MongoDB
+Extended JSON (ObjectIds and datetimes round-trip), so memory use is bounded
+by the batch size, not the size of the collection.
+
+    python backup.py export conversations.jsonl.gz
+    python backup.py import conversations.jsonl.gz --uri mongodb://other-host
+
+Both commands keep a checkpoint next to the backup file and pick up where
+they stopped when re-run with --resume. Imports use unordered insert_many;
+conversations that already exist are counted as skipped, not failed.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+DEFAULT_BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+
+def _checkpoint_path(path: Path, command: str) -> Path:
+    return path.with_name(f"{path.name}.{command}.ckpt")
+
+
+def _load_checkpoint(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: Path, state: Dict):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def export_conversations(collection, path: Path, batch_size: int = DEFAULT_BATCH_SIZE,
+                         resume: bool = False) -> Dict[str, int]:
+    """Write every document to gzip JSONL, one gzip member per batch
+
+    After each batch the file size and last _id are checkpointed; a resumed
+    export truncates back to that size and continues after that _id.
+    """
+    checkpoint_path = _checkpoint_path(path, "export")
+    checkpoint = _load_checkpoint(checkpoint_path) if resume else None
+    query, exported = {}, 0
+    if checkpoint:
+        query = {"_id": {"$gt": json_util.loads(checkpoint["last_id"])}}
+        exported = checkpoint["documents"]
+        with open(path, "r+b") as f:
+            f.truncate(checkpoint["bytes"])
+    elif path.exists():
+        path.unlink()
+
+    cursor = collection.find(query).sort("_id", 1).batch_size(batch_size)
+    with open(path, "ab") as f:
+        lines = []
+        for document in cursor:
+            lines.append(json_util.dumps(document, json_options=RELAXED_JSON_OPTIONS))
+            if len(lines) >= batch_size:
+                exported += _write_batch(f, lines, checkpoint_path, document["_id"], exported)
+                lines = []
+        if lines:
+            exported += _write_batch(f, lines, checkpoint_path, document["_id"], exported)
+
+    checkpoint_path.unlink(missing_ok=True)
+    return {"documents": exported, "bytes": path.stat().st_size}
+
+
+def _write_batch(f, lines, checkpoint_path: Path, last_id, exported: int) -> int:
+    # A self-contained gzip member per batch: a crash never leaves a torn stream
+    # behind the last checkpoint, and gzip readers treat the members as one file
+    f.write(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+    f.flush()
+    os.fsync(f.fileno())
+    _save_checkpoint(checkpoint_path, {
+        "last_id": json_util.dumps(last_id),
+        "documents": exported + len(lines),
+        "bytes": f.tell(),
+    })
+    return len(lines)
+
+
+def import_conversations(collection, path: Path, batch_size: int = DEFAULT_BATCH_SIZE,
+                         resume: bool = False) -> Dict[str, int]:
+    """Insert documents from gzip JSONL in unordered batches"""
+    checkpoint_path = _checkpoint_path(path, "import")
+    checkpoint = _load_checkpoint(checkpoint_path) if resume else None
+    done = checkpoint["lines"] if checkpoint else 0
+    stats = {"inserted": 0, "skipped": 0, "failed": 0}
+    if checkpoint:
+        stats.update(checkpoint["stats"])
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        batch, line_number = [], 0
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= done or not line.strip():
+                continue
+            batch.append(json_util.loads(line))
+            if len(batch) >= batch_size:
+                _insert_batch(collection, batch, stats)
+                _save_checkpoint(checkpoint_path, {"lines": line_number, "stats": stats})
+                batch = []
+        if batch:
+            _insert_batch(collection, batch, stats)
+
+    checkpoint_path.unlink(missing_ok=True)
+    return stats
+
+
+def _insert_batch(collection, batch, stats: Dict[str, int]):
+    try:
+        result = collection.insert_many(batch, ordered=False)
+        stats["inserted"] += len(result.inserted_ids)
+    except BulkWriteError as e:
+        details = e.details
+        duplicates = sum(1 for error in details["writeErrors"] if error["code"] == DUPLICATE_KEY)
+        stats["inserted"] += details["nInserted"]
+        stats["skipped"] += duplicates
+        stats["failed"] += len(details["writeErrors"]) - duplicates
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export/import stored conversations as gzip JSONL")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", type=Path, help="backup file (.jsonl.gz)")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI"), help="defaults to MONGODB_URI")
+    parser.add_argument("--db", default="chat_history")
+    parser.add_argument("--collection", default="conversations")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    args = parser.parse_args(argv)
+
+    if not args.uri:
+        parser.error("no MongoDB URI: pass --uri or set MONGODB_URI")
+    collection = MongoClient(args.uri)[args.db][args.collection]
+
+    start = time.perf_counter()
+    if args.command == "export":
+        result = export_conversations(collection, args.path, args.batch_size, args.resume)
+    else:
+        result = import_conversations(collection, args.path, args.batch_size, args.resume)
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(result))
+    return 1 if result.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
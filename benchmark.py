@@ -0,0 +1,274 @@
+"""Offline benchmark for the chat turn logic of each aigf configuration, coach.py and app.py.
+
+Drives each app headlessly with Streamlit's AppTest while Anthropic, ElevenLabs
+and MongoDB are replaced by the in-process fakes in fakes.py, so the numbers are
+reproducible without network access. AppTest sessions cannot share a process
+concurrently, so concurrent sessions each run in their own worker process.
+
+    python benchmark.py
+    python benchmark.py --apps coach --lengths 0 20 100 --sessions 1 8 --turns 5
+    python benchmark.py --apps aigf aigf_cloud aigf_speech aigf_prod --sessions 1
+    python benchmark.py --llm-ttft 0.3 --llm-tps 60 --mongo-latency 0.005 --json bench.json
+
+With --importtime it instead reports each app's cold-start import cost, from
+`python -X importtime` in a fresh interpreter, and the packages that dominate it:
+
+    python benchmark.py --importtime --top 10
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import fakes
+from message_writer import get_writer
+from shared_cache import get_shared_cache
+from transcript import Transcript
+
+APP_DIR = Path(__file__).resolve().parent
+
+# How each app takes a user turn; the aigf entries are aigf_app.py's CONFIGS
+APPS = {
+    "aigf": {"script": "aigf.py", "input": "chat", "history": True},
+    "aigf_cloud": {"script": "aigf_cloud.py", "input": "chat", "history": True},
+    "aigf_speech": {"script": "aigf_speech.py", "input": "chat", "history": True},
+    "aigf_prod": {"script": "aigf_prod.py", "input": "chat", "history": True},
+    "coach": {"script": "coach.py", "input": "chat", "history": True},
+    "app": {"script": "app.py", "input": "form", "history": False},
+}
+
+TURN_TEXT = "Hey, how was your day? Tell me something about it."
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def new_session(app: str) -> AppTest:
+    """Start a fresh headless session of `app`"""
+    at = AppTest.from_file(str(APP_DIR / APPS[app]["script"]), default_timeout=120)
+    at.run()
+    return at
+
+
+def prefill(at: AppTest, app: str, length: int):
+    """Seed the session with a synthetic transcript of `length` messages"""
+    if length and APPS[app]["history"]:
+        at.session_state["messages"] = Transcript(fakes.synthetic_history(length))
+
+
+def send_turn(at: AppTest, app: str, text: str = TURN_TEXT) -> float:
+    """Submit one user turn and return the rerun wall time in seconds"""
+    start = time.perf_counter()
+    if APPS[app]["input"] == "chat":
+        at.chat_input[0].set_value(text).run()
+    else:
+        at.text_input[0].set_value(text)
+        at.button[0].click().run()
+    elapsed = time.perf_counter() - start
+    if at.exception or at.error:
+        messages = [e.message for e in at.exception] + [e.value for e in at.error]
+        raise RuntimeError("; ".join(messages))
+    return elapsed
+
+
+def _worker_ready(_) -> int:
+    return os.getpid()
+
+
+def _run_session(app: str, length: int, turns: int, latency: fakes.FakeLatency, barrier=None) -> Dict:
+    os.chdir(APP_DIR)  # apps read personas/ and coach/ relative to the cwd
+    latencies, stages, errors = [], [], 0
+    with fakes.offline_services(latency):
+        at = new_session(app)
+        # The first script run imports the app; turns start once every session is open
+        if barrier is not None:
+            barrier.wait(timeout=600)
+        started = time.time()
+        for _ in range(turns):
+            prefill(at, app, length)
+            try:
+                latencies.append(send_turn(at, app))
+            except Exception:
+                errors += 1
+            traces = at.session_state["traces"] if "traces" in at.session_state else None
+            if traces:
+                stages.append(traces[-1]["spans_ms"])
+    return {"latencies": latencies, "stages": stages, "errors": errors, "started": started, "finished": time.time()}
+
+
+def measure_allocations(app: str, length: int, turns: int) -> Dict:
+    """Bytes allocated per turn (peak and retained) for a single session"""
+    at = new_session(app)
+    prefill(at, app, length)
+    send_turn(at, app)  # warm imports and caches outside the measurement
+
+    tracemalloc.start()
+    try:
+        peaks, retained = [], []
+        for _ in range(turns):
+            prefill(at, app, length)
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            send_turn(at, app)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_kb": round(statistics.mean(peaks) / 1024, 1),
+        "alloc_retained_kb": round(statistics.mean(retained) / 1024, 1),
+    }
+
+
+def run_config(app: str, length: int, sessions: int, turns: int,
+               latency: fakes.FakeLatency, allocations: bool = True) -> Dict:
+    """Benchmark `sessions` concurrent sessions each sending `turns` turns"""
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager, ProcessPoolExecutor(max_workers=sessions, mp_context=context) as pool:
+        # Start the workers first; each then opens its session and waits for the others
+        list(pool.map(_worker_ready, range(sessions)))
+        barrier = manager.Barrier(sessions)
+        futures = [pool.submit(_run_session, app, length, turns, latency, barrier) for _ in range(sessions)]
+        results = [f.result() for f in futures]
+    # Wall-clock stamps, so the window spans every worker process
+    wall = max(r["finished"] for r in results) - min(r["started"] for r in results)
+
+    latencies = [t for r in results for t in r["latencies"]]
+    stages = [s for r in results for s in r["stages"]]
+    errors = sum(r["errors"] for r in results)
+    report = {
+        "app": app,
+        "history": length if APPS[app]["history"] else 0,
+        "sessions": sessions,
+        "turns": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "throughput_tps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "stages_ms": {
+            stage: round(statistics.mean(s.get(stage, 0.0) for s in stages), 2)
+            for stage in sorted({k for s in stages for k in s})
+        },
+    }
+    if allocations:
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        get_writer().flush()
+        fakes.FakeMongoClient.reset()
+        get_shared_cache().invalidate("recent_conversations")
+        with fakes.offline_services(latency):
+            report.update(measure_allocations(app, length, min(turns, 3)))
+    return report
+
+
+def import_profile(app: str, top: int = 8) -> Dict:
+    """Import cost of `app`'s module in a fresh interpreter, split by top-level package"""
+    module = Path(APPS[app]["script"]).stem
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True,
+        env=dict(os.environ, WARMUP="0", PYTHONDONTWRITEBYTECODE="1"),
+    )
+    total_us, packages = 0, {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "app": app,
+        "import_ms": round(total_us / 1000, 1),
+        "modules": sum(1 for line in result.stderr.splitlines() if line.startswith("import time:")) - 1,
+        "heaviest": {package: round(us / 1000, 1) for package, us in heaviest},
+    }
+
+
+def print_import_table(reports: List[Dict]):
+    for report in reports:
+        print(f"{report['app']}: {report['import_ms']} ms, {report['modules']} modules")
+        for package, ms in report["heaviest"].items():
+            print(f"  {package:<24} {ms:>8} ms")
+
+
+def print_table(reports: List[Dict]):
+    columns = ["app", "history", "sessions", "turns", "errors", "p50_ms", "p90_ms", "p99_ms",
+               "throughput_tps", "alloc_peak_kb", "alloc_retained_kb"]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in reports)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for report in reports:
+        print("  ".join(str(report.get(c, "")).rjust(widths[c]) for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline turn benchmark for the Streamlit apps")
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--lengths", nargs="+", type=int, default=[0, 20, 100],
+                        help="conversation lengths (messages already in the session)")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 4],
+                        help="numbers of concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--llm-ttft", type=float, default=0.0, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=0.0, help="fake LLM tokens per second (0 = instant)")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="fake TTS seconds per character")
+    parser.add_argument("--mongo-latency", type=float, default=0.0, help="fake MongoDB seconds per operation")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--importtime", action="store_true",
+                        help="report cold-start import cost per app instead of turn latency")
+    parser.add_argument("--top", type=int, default=8, help="packages listed per app with --importtime")
+    parser.add_argument("--json", help="also write the reports to this file")
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        reports = [import_profile(app, args.top) for app in args.apps]
+        print_import_table(reports)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(reports, f, indent=2)
+        return
+
+    latency = fakes.FakeLatency(args.llm_ttft, args.llm_tps, args.tts_latency, args.mongo_latency)
+    os.chdir(APP_DIR)  # apps read personas/ and coach/ relative to the cwd
+    reports = []
+    for app in args.apps:
+        lengths = args.lengths if APPS[app]["history"] else [0]
+        for length in lengths:
+            for sessions in args.sessions:
+                reports.append(run_config(app, length, sessions, args.turns, latency, not args.no_alloc))
+                print(f"done: {app} history={length} sessions={sessions}", file=sys.stderr)
+
+    print_table(reports)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    # AppTest swaps out sys.modules["__main__"], so run via the importable module
+    # to keep the worker functions picklable
+    from benchmark import main
+    main()
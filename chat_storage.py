@@ -0,0 +1,193 @@
+"""Conversation storage in MongoDB (chat_history.conversations), shared by every session of a process"""
+import re
+import warnings
+from datetime import datetime
+from typing import List
+
+import streamlit as st
+from bson import ObjectId
+
+from core import get_secret, lazy_import
+from mongo_pool import client_options
+from persona import DEFAULT_PERSONA
+from shared_cache import get_shared_cache
+
+pymongo = lazy_import("pymongo")
+
+
+# Add caching for MongoDB connection
+@st.cache_resource
+def init_mongo_connection(allow_invalid_certificates: bool = False):
+    """Initialize MongoDB connection with caching
+
+    One pooled client per process; connections open in the background, and
+    CloudChatStorage's first command reports an unreachable server.
+    """
+    try:
+        # Get MongoDB URI from secrets
+        mongo_uri = get_secret("MONGODB_URI")
+
+        # Create client with the pool, compression and monitoring settings from mongo_pool
+        with warnings.catch_warnings():
+            # Compressors whose library is not installed are dropped, each with a warning
+            warnings.filterwarnings("ignore", message="Wire protocol compression")
+            return pymongo.MongoClient(mongo_uri, **client_options(allow_invalid_certificates))
+    except Exception as e:
+        st.error(f"Failed to connect to MongoDB: {str(e)}")
+        raise
+
+
+def search_terms(query: str) -> List[str]:
+    """Words of a search query, without quotes or negated terms"""
+    return [word.strip('"') for word in query.split() if word.strip('"') and not word.startswith('-')]
+
+
+class CloudChatStorage:
+    def __init__(self, cached_listing: bool = True, allow_invalid_certificates: bool = False):
+        self.cached_listing = cached_listing
+        self.allow_invalid_certificates = allow_invalid_certificates
+        try:
+            self.client = init_mongo_connection(allow_invalid_certificates)
+            self.db = self.client.get_database("chat_history")
+            # Text index backing search_conversations (no-op if it already exists);
+            # also the first round trip, so a bad URI or certificate fails here
+            self.db.conversations.create_index(
+                [('messages.content', 'text')],
+                name='messages_content_text'
+            )
+        except Exception as e:
+            st.error(f"Failed to initialize database connection: {str(e)}")
+            raise
+
+    @staticmethod
+    def _find_recent_conversations(db, limit: int):
+        # Only the fields the sidebar needs; messages load when a conversation is opened
+        return list(db.conversations.find({}, {'timestamp': 1, 'persona': 1})
+                    .sort('timestamp', -1)
+                    .limit(limit))
+
+    def get_recent_conversations(self, limit=10):
+        """Get the most recent conversations, through the shared cache unless listing is uncached
+
+        The cache is shared by every replica, so a conversation created or
+        deleted on one shows up in the sidebar on all of them.
+        """
+        if not self.cached_listing:
+            return self._find_recent_conversations(self.db, limit)
+        return get_shared_cache().get_or_load(
+            "recent_conversations", f"{self.db.name}:{limit}",
+            lambda: self._find_recent_conversations(self.db, limit)
+        )
+
+    def start_conversation(self):
+        """Allocate an ID for a new conversation; nothing is written until its first message"""
+        return ObjectId()
+
+    def save_message(self, conversation_id, role, content, persona=None, message_id=None, timestamp=None):
+        """Append a message; with `message_id`, saving the same message again is a no-op
+
+        Returns False when the message was already stored.
+        """
+        message = {
+            'role': role,
+            'content': content,
+            'timestamp': timestamp or datetime.now()
+        }
+        query = {'_id': conversation_id}
+        if message_id is not None:
+            message['id'] = message_id
+            # A retry of a write that did land matches nothing, and its upsert hits the existing _id
+            query['messages.id'] = {'$ne': message_id}
+        # The first message creates the conversation document in the same round trip
+        try:
+            result = self.db.conversations.update_one(
+                query,
+                {
+                    '$setOnInsert': {
+                        'timestamp': message['timestamp'],
+                        'session_id': message['timestamp'].strftime("%Y%m%d_%H%M%S"),
+                        'persona': persona or DEFAULT_PERSONA
+                    },
+                    '$set': {'updated_at': message['timestamp']},
+                    '$push': {'messages': message}
+                },
+                upsert=True
+            )
+        except pymongo.errors.DuplicateKeyError:
+            if message_id is None:
+                raise
+            return False
+        if self.cached_listing and result.upserted_id is not None:
+            # A new conversation: every replica's sidebar listing is out of date
+            get_shared_cache().invalidate("recent_conversations")
+        return True
+
+    def get_conversation_history(self, conversation_id):
+        conversation = self.db.conversations.find_one({'_id': conversation_id}, {'messages': 1})
+        return conversation['messages'] if conversation else []
+
+    def search_conversations(self, query: str, page: int = 0, page_size: int = 10):
+        """Ranked full-text search over message content, served by the text index
+
+        Returns (results, has_more). Each result holds _id, timestamp, score and
+        up to 3 matching messages for snippets, filtered server-side so only
+        a bounded amount of text comes back per page.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return [], False
+        pattern = '|'.join(re.escape(term) for term in terms)
+        pipeline = [
+            {'$match': {'$text': {'$search': query}}},
+            {'$sort': {'score': {'$meta': 'textScore'}, 'timestamp': -1}},
+            {'$skip': page * page_size},
+            {'$limit': page_size + 1},
+            {'$project': {
+                'timestamp': 1,
+                'persona': 1,
+                'score': {'$meta': 'textScore'},
+                'matches': {'$slice': [
+                    {'$filter': {
+                        'input': '$messages',
+                        'as': 'm',
+                        'cond': {'$regexMatch': {'input': '$$m.content', 'regex': pattern, 'options': 'i'}}
+                    }},
+                    3
+                ]}
+            }}
+        ]
+        results = list(self.db.conversations.aggregate(pipeline))
+        return results[:page_size], len(results) > page_size
+
+    def sample_conversations(self, size: int = 50):
+        """Random stored conversations with their messages (for replay.py)"""
+        return list(self.db.conversations.aggregate([
+            {'$sample': {'size': size}},
+            {'$project': {'timestamp': 1, 'persona': 1, 'messages': 1}}
+        ]))
+
+    def delete_conversation(self, conversation_id):
+        try:
+            result = self.db.conversations.delete_one({'_id': conversation_id})
+            # Drop the listing on every replica after deletion
+            get_shared_cache().invalidate("recent_conversations")
+            return result.deleted_count > 0
+        except Exception as e:
+            st.error(f"Error deleting conversation: {str(e)}")
+            return False
+
+    def clear_all_conversations(self):
+        try:
+            result = self.db.conversations.delete_many({})
+            # Drop the listing on every replica after clearing all conversations
+            get_shared_cache().invalidate("recent_conversations")
+            return result.deleted_count
+        except Exception as e:
+            st.error(f"Error clearing conversations: {str(e)}")
+            return 0
+
+
+@st.cache_resource
+def get_storage(cached_listing: bool = True, allow_invalid_certificates: bool = False) -> CloudChatStorage:
+    """Chat storage shared across sessions"""
+    return CloudChatStorage(cached_listing, allow_invalid_certificates)
@@ -1,11 +1,18 @@
 import streamlit as st
-from anthropic import Anthropic
+from llm_scheduler import ScheduledClient, scheduled_client
+from model_router import get_router
+from fast_path import canned_reply
 from typing import List, Dict
 import json
 import time
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from tracing import TurnTrace, finish_trace, render_debug_panel
+from turn_engine import start_turn, follow_turn, end_turn
+from transcript import Transcript
+from session_manager import track_session
+from warmup import warm_process, prime_prompt_cache, cached_system
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +20,8 @@ ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 
 # Define coach directory
 COACH_DIR = "coach"
+# Top-level sections of a coach file; other headers nest under COACHING STYLE
+SECTIONS = {"traits", "coaching style", "expertise areas", "coaching frameworks"}
 
 def load_personality_from_file(filename: str) -> Dict:
     """Load and parse personality from a text file in the coach directory"""
@@ -51,8 +60,16 @@ def load_personality_from_file(filename: str) -> Dict:
             if not line:
                 continue
 
-            if line.endswith(':'):
-                current_section = line[:-1].lower()
+            # Inside COACHING STYLE, headers (APPROACH:, GREETINGS:, SUPPORTIVE: ...)
+            # are subsections; only the top-level ones start a new section
+            header = line[:-1].lower()
+            # TRAINING STYLE / MEDITATION FRAMEWORKS etc. are the same sections under another name
+            if header.endswith(" style") and header != "conversation style":
+                header = "coaching style"
+            elif header.endswith(" frameworks"):
+                header = "coaching frameworks"
+            if line.endswith(':') and (current_section != "coaching style" or header in SECTIONS):
+                current_section = header
                 current_subsection = None
                 response_type = None
                 continue
@@ -73,12 +90,10 @@ def load_personality_from_file(filename: str) -> Dict:
                     current_subsection = "greetings"
                 elif line.startswith('RESPONSES:'):
                     current_subsection = "responses"
-                elif line.startswith('SUPPORTIVE:'):
-                    response_type = "supportive"
-                elif line.startswith('CHALLENGING:'):
-                    response_type = "challenging"
-                elif line.startswith('NEUTRAL:'):
-                    response_type = "neutral"
+                elif line.endswith(':') and current_subsection == "responses":
+                    # SUPPORTIVE:, CHALLENGING:, NEUTRAL: or coach-specific kinds (ANALYTICAL: ...)
+                    response_type = line[:-1].lower()
+                    personality["coaching_style"]["conversation_style"]["responses"].setdefault(response_type, [])
                 elif line.startswith('-'):
                     if current_subsection == "approach":
                         personality["coaching_style"]["approach"].append(line[1:].strip())
@@ -154,18 +169,46 @@ Your coaching approach:
     return prompt
 
 
+@st.cache_resource
+def get_client() -> ScheduledClient:
+    """Anthropic client shared across sessions, rate limited by the process-wide scheduler"""
+    return scheduled_client(ANTHROPIC_API_KEY)
+
+
+@st.cache_resource
+def get_personality(filename: str) -> Dict:
+    """Parsed coach personality shared across sessions (treat as read-only)"""
+    return load_personality_from_file(filename)
+
+
 def init_chat() -> None:
     """Initialize chat history and settings in session state"""
+    # Idle sessions spill their transcript to disk; this restores it on return
+    track_session("coach", spill=True)
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = Transcript()
     if "personality" not in st.session_state:
         st.session_state.personality = None
-    if "client" not in st.session_state:
-        st.session_state.client = Anthropic(api_key=ANTHROPIC_API_KEY)
 
 
+def complete_turn(turn):
+    """Show a background reply as it streams, then add it to chat history"""
+    with st.chat_message("assistant"):
+        try:
+            full_response = follow_turn(turn, st.empty())
+
+            # Add assistant response to chat history
+            st.session_state.messages.add("assistant", full_response)
+        except Exception as e:
+            turn.trace.error = str(e)
+            st.error(f"Error: {str(e)}")
+    # Not in a finally: a rerun interrupting follow_turn must leave the turn active
+    end_turn(turn)
+    finish_trace(turn.trace)
+
 def main():
     st.title("AI Coach")
+    warm_process({"client": get_client})
     init_chat()
 
     # Add coach selection dropdown
@@ -182,10 +225,12 @@ def main():
 
     # Load selected personality
     if selected_coach != st.session_state.get("current_coach"):
-        st.session_state.personality = load_personality_from_file(selected_coach)
+        st.session_state.personality = get_personality(selected_coach)
         st.session_state.current_coach = selected_coach
-        st.session_state.messages = []  # Clear chat history when switching coaches
+        st.session_state.messages = Transcript()  # Clear chat history when switching coaches
         if st.session_state.personality:
+            # Cache the new coach's prompt while the user is still reading and typing
+            prime_prompt_cache(get_client, create_system_prompt(st.session_state.personality))
             st.success(f"Loaded personality for {st.session_state.personality['basic_info'].get('name', 'Coach')}")
 
     # Sidebar to display coach info
@@ -215,42 +260,55 @@ def main():
             st.write(message["content"])
 
     # Chat input
-    if prompt := st.chat_input("What would you like to discuss today?"):
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.write(prompt)
-
-        # Get AI response
-        with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            full_response = ""
-
-            try:
-                messages = [
-                    {
-                        "role": "assistant",
-                        "content": create_system_prompt(st.session_state.personality)
-                    }
-                ]
-                messages.extend(st.session_state.messages)
+    prompt = st.chat_input("What would you like to discuss today?")
 
-                response = st.session_state.client.messages.create(
-                    model="claude-3-opus-20240229",
-                    max_tokens=1024,
-                    messages=messages
-                )
+    # Reattach to a reply that was still generating when the last run was interrupted
+    if "active_turn" in st.session_state:
+        complete_turn(st.session_state.active_turn)
 
-                full_response = response.content[0].text
-                message_placeholder.markdown(full_response)
+    if prompt:
+        trace = TurnTrace("coach")
 
-                # Add assistant response to chat history
-                st.session_state.messages.append({"role": "assistant", "content": full_response})
+        history = st.session_state.messages
+        previous = history[-1]["content"] if history and history[-1]["role"] == "assistant" else None
 
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                return
+        # Add user message to chat history
+        st.session_state.messages.add("user", prompt)
+        with st.chat_message("user"):
+            st.write(prompt)
 
+        # Openers get one of the coach's own greetings instantly; coaching goes to the LLM
+        canned = canned_reply(prompt, st.session_state.personality, previous, intents=("greeting",))
+        if canned is not None:
+            trace.route = "canned"
+            trace.count("fast_path")
+            with st.chat_message("assistant"):
+                st.write(canned)
+            st.session_state.messages.add("assistant", canned)
+            finish_trace(trace)
+        else:
+            # Route by message and coach type (e.g. business coaching gets the heavy model)
+            route = get_router().route(
+                prompt, len(st.session_state.messages) - 1, st.session_state.get("current_coach")
+            )
+            trace.route = route.name
+
+            # Get AI response
+            with trace.span("prompt_build"):
+                system = cached_system(route.model, create_system_prompt(st.session_state.personality))
+                messages = st.session_state.messages.to_api()
+
+            turn = start_turn(
+                get_client(),
+                trace,
+                model=route.model,
+                max_tokens=1024,
+                system=system,
+                messages=messages
+            )
+            complete_turn(turn)
+
+    render_debug_panel()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""Shared core for the apps: heavy SDKs imported on first use instead of at script start
+
+Importing anthropic alone takes over a second (pydantic and httpx with it), and
+a fresh process pays that before the first page can render even when the page
+never calls the LLM, TTS or storage. Modules bind these as `lazy_import(...)`
+proxies so the import happens the first time an attribute is used, and
+`preload` lets warm-up do it in a background thread instead.
+"""
+import importlib
+import os
+import sys
+import threading
+from types import ModuleType
+from typing import Dict, Optional
+
+import streamlit as st
+
+# Subsystem name -> module it needs
+SUBSYSTEMS = {
+    "llm": "anthropic",
+    "storage": "pymongo",
+    "speech": "elevenlabs",
+    "memory": "numpy",
+}
+
+
+def get_secret(key: str) -> Optional[str]:
+    """Get secret from environment or Streamlit secrets"""
+    return os.getenv(key) or st.secrets.get(key)
+
+
+class LazyModule:
+    """Stands in for a module until an attribute is first looked up"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        # Looked up on every access so patches applied to the real module are seen
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+_modules: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """A proxy for module `name` that imports it on first attribute access"""
+    if name not in _modules:
+        _modules[name] = LazyModule(name)
+    return _modules[name]
+
+
+def preload(*subsystems: str) -> threading.Thread:
+    """Import the given subsystems' modules in a background thread"""
+    def run():
+        for subsystem in subsystems:
+            try:
+                lazy_import(SUBSYSTEMS.get(subsystem, subsystem))._load()
+            except ImportError:
+                # The subsystem's own first use reports the missing dependency
+                pass
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def loaded() -> Dict[str, bool]:
+    """Which subsystems have been imported so far"""
+    return {subsystem: module in sys.modules for subsystem, module in SUBSYSTEMS.items()}
@@ -0,0 +1,696 @@
+"""In-process stand-ins for Anthropic, ElevenLabs and MongoDB used by the benchmarks"""
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+from unittest import mock
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from model_router import is_cacheable
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class FakeLatency:
+    """Latency settings shared by all fakes (seconds)"""
+
+    def __init__(self, llm_ttft: float = 0.0, llm_tokens_per_sec: float = 0.0,
+                 tts_per_char: float = 0.0, mongo_op: float = 0.0):
+        self.llm_ttft = llm_ttft
+        self.llm_tokens_per_sec = llm_tokens_per_sec
+        self.tts_per_char = tts_per_char
+        self.mongo_op = mongo_op
+
+
+LATENCY = FakeLatency()
+
+REPLY_WORDS = ("sure", "that", "sounds", "really", "lovely", "and", "I", "think",
+               "we", "should", "talk", "about", "it", "more", "today", "okay")
+
+
+# ---------------------------------------------------------------- Anthropic
+
+def fake_reply(messages: List[Dict], words: int = 40) -> str:
+    """Deterministic reply text derived from the conversation"""
+    digest = hashlib.sha256(str(len(messages)).encode() + str(messages[-1]["content"]).encode()).digest()
+    return " ".join(REPLY_WORDS[digest[i % len(digest)] % len(REPLY_WORDS)] for i in range(words)) + "."
+
+
+class _FakeStream:
+    def __init__(self, request: Dict):
+        self._request = request
+        self._text = fake_reply(request["messages"])
+        self._usage = _usage(request, self._text)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        time.sleep(LATENCY.llm_ttft)
+        for i, word in enumerate(self._text.split(" ")):
+            if LATENCY.llm_tokens_per_sec:
+                time.sleep(1 / LATENCY.llm_tokens_per_sec)
+            yield word if i == 0 else " " + word
+
+    def get_final_message(self):
+        return _message(self._request, self._text, self._usage)
+
+
+# (model, system prefix) pairs written by earlier requests, like the API's prompt cache
+_prompt_cache = set()
+
+
+def _cached_prefix(system) -> str:
+    """System text up to the last cache_control breakpoint"""
+    if not isinstance(system, list):
+        return ""
+    ends = [i for i, block in enumerate(system) if block.get("cache_control")]
+    return "".join(block["text"] for block in system[:ends[-1] + 1]) if ends else ""
+
+
+def _usage(request: Dict, text: str):
+    system = request.get("system", "")
+    prefix = _cached_prefix(system)
+    prompt = str(system) + "".join(str(m["content"]) for m in request["messages"])
+    created = read = 0
+    # Like the API, a prefix under the model's minimum is neither written nor read
+    if prefix and is_cacheable(prefix, request.get("model")):
+        key = (request.get("model"), prefix)
+        if key in _prompt_cache:
+            read = estimate_tokens(prefix)
+        else:
+            created = estimate_tokens(prefix)
+            _prompt_cache.add(key)
+    return SimpleNamespace(input_tokens=max(0, estimate_tokens(prompt) - created - read),
+                           output_tokens=estimate_tokens(text),
+                           cache_creation_input_tokens=created, cache_read_input_tokens=read)
+
+
+def _message(request: Dict, text: str, usage):
+    return SimpleNamespace(
+        content=[SimpleNamespace(type="text", text=text)],
+        model=request.get("model"),
+        role="assistant",
+        stop_reason="end_turn",
+        usage=usage,
+    )
+
+
+class _FakeMessages:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, **request):
+        self._client.calls.append(request)
+        text = fake_reply(request["messages"])
+        time.sleep(LATENCY.llm_ttft)
+        if LATENCY.llm_tokens_per_sec:
+            time.sleep(estimate_tokens(text) / LATENCY.llm_tokens_per_sec)
+        return _message(request, text, _usage(request, text))
+
+    def stream(self, **request):
+        self._client.calls.append(request)
+        return _FakeStream(request)
+
+
+class FakeAnthropic:
+    """Drop-in for anthropic.Anthropic with canned, deterministic replies"""
+
+    def __init__(self, *args, **kwargs):
+        self.calls: List[Dict] = []
+        self.messages = _FakeMessages(self)
+
+
+class _FakeLLMHandler(BaseHTTPRequestHandler):
+    """Serves POST /v1/messages like the Anthropic API, streaming or not"""
+
+    def do_POST(self):
+        if not self.path.startswith("/v1/messages"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.requests += 1
+        text = fake_reply(request["messages"])
+        usage = _usage(request, text)
+        message = {
+            "id": f"msg_fake_{self.server.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model"),
+            "content": [],
+            "stop_reason": None,
+            "stop_sequence": None,
+            "usage": {"input_tokens": usage.input_tokens, "output_tokens": 1},
+        }
+        time.sleep(self.server.ttft)
+
+        if not request.get("stream"):
+            if self.server.tokens_per_sec:
+                time.sleep(usage.output_tokens / self.server.tokens_per_sec)
+            message.update(content=[{"type": "text", "text": text}], stop_reason="end_turn",
+                           usage={"input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens})
+            body = json.dumps(message).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self._event("message_start", {"type": "message_start", "message": message})
+        self._event("content_block_start", {"type": "content_block_start", "index": 0,
+                                            "content_block": {"type": "text", "text": ""}})
+        for i, word in enumerate(text.split(" ")):
+            if self.server.tokens_per_sec:
+                time.sleep(1 / self.server.tokens_per_sec)
+            self._event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                "delta": {"type": "text_delta",
+                                                          "text": word if i == 0 else " " + word}})
+        self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event("message_delta", {"type": "message_delta",
+                                      "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": usage.output_tokens}})
+        self._event("message_stop", {"type": "message_stop"})
+        self.close_connection = True
+
+    def _event(self, name: str, data: Dict):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLLMServer:
+    """Local HTTP stand-in for the Anthropic Messages API with a set token rate
+
+    Point the real SDK at it with ANTHROPIC_BASE_URL=server.url.
+    """
+
+    def __init__(self, ttft: float = 0.0, tokens_per_sec: float = 0.0, port: int = 0):
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _FakeLLMHandler)
+        self._server.daemon_threads = True
+        self._server.ttft = ttft
+        self._server.tokens_per_sec = tokens_per_sec
+        self._server.requests = 0
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def start(self) -> "FakeLLMServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --------------------------------------------------------------- ElevenLabs
+
+def fake_generate(text, api_key=None, voice=None, model=None, stream: bool = False, **kwargs):
+    """Drop-in for elevenlabs.generate returning silent MP3-sized bytes"""
+    if not isinstance(text, str):
+        text = "".join(text)
+    # Roughly 1 KB of 128 kbps MP3 per spoken word
+    audio = b"\xff\xfb\x90\x64" * (256 * max(1, len(text.split())))
+    if stream:
+        return _stream_audio(audio, len(text))
+    time.sleep(LATENCY.tts_per_char * len(text))
+    return audio
+
+
+def _stream_audio(audio: bytes, chars: int, chunk_size: int = 2048) -> Iterator[bytes]:
+    chunks = max(1, len(audio) // chunk_size)
+    for i in range(0, len(audio), chunk_size):
+        time.sleep(LATENCY.tts_per_char * chars / chunks)
+        yield audio[i:i + chunk_size]
+
+
+# ------------------------------------------------------------------ MongoDB
+
+class _Result(SimpleNamespace):
+    pass
+
+
+def _get_path(doc: Dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, list):
+            return [item.get(part) for item in value if isinstance(item, dict)]
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _matches(doc: Dict, query: Dict) -> bool:
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(doc, q) for q in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches(doc, q) for q in condition):
+                return False
+            continue
+        if key == "$text":
+            terms = condition["$search"].lower().split()
+            text = " ".join(str(m.get("content", "")) for m in doc.get("messages", [])).lower()
+            if not any(term in text for term in terms):
+                return False
+            continue
+        value = _get_path(doc, key)
+        if isinstance(condition, dict) and any(k.startswith("$") for k in condition):
+            for op, operand in condition.items():
+                values = value if isinstance(value, list) else [value]
+                if op == "$ne" and operand in values:
+                    return False
+                if op == "$eq" and operand not in values:
+                    return False
+                if op == "$in" and not any(v in operand for v in values):
+                    return False
+                # Like MongoDB, a comparison on an array path matches if any element does
+                if op == "$lt" and not any(v is not None and v < operand for v in values):
+                    return False
+                if op == "$lte" and not any(v is not None and v <= operand for v in values):
+                    return False
+                if op == "$gt" and not any(v is not None and v > operand for v in values):
+                    return False
+                if op == "$gte" and not any(v is not None and v >= operand for v in values):
+                    return False
+                if op == "$not" and _matches(doc, {key: operand}):
+                    return False
+                if op == "$exists" and (value is not None) != operand:
+                    return False
+                if op == "$size" and (not isinstance(value, list) or len(value) != operand):
+                    return False
+        elif isinstance(value, list) and not isinstance(condition, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k: v for k, v in projection.items() if not isinstance(v, dict)}
+    if include and all(not v for v in include.values()):
+        return {k: copy.deepcopy(v) for k, v in doc.items() if k not in include}
+    result = {"_id": doc["_id"]} if projection.get("_id", 1) else {}
+    for key, spec in projection.items():
+        if key == "_id":
+            continue
+        if isinstance(spec, dict) and "$slice" in spec:
+            result[key] = copy.deepcopy(doc.get(key, [])[spec["$slice"]:] if spec["$slice"] < 0
+                                        else doc.get(key, [])[:spec["$slice"]])
+        elif isinstance(spec, dict) and "$size" in spec:
+            result[key] = len(doc.get(spec["$size"].lstrip("$"), []))
+        elif spec and key in doc:
+            result[key] = copy.deepcopy(doc[key])
+    return result
+
+
+def _text_score(doc: Dict, search: str) -> float:
+    text = " ".join(str(m.get("content", "")) for m in doc.get("messages", [])).lower()
+    return float(sum(text.count(term) for term in search.lower().split()))
+
+
+def _aggregate_project(doc: Dict, spec: Dict, score: float) -> Dict:
+    """$project supporting field inclusion, textScore and $slice of a $filter/$regexMatch"""
+    result = {"_id": doc["_id"]}
+    for key, value in spec.items():
+        if value == 1 and key in doc:
+            result[key] = doc[key]
+        elif isinstance(value, dict) and value.get("$meta") == "textScore":
+            result[key] = score
+        elif isinstance(value, dict) and "$slice" in value:
+            source, count = value["$slice"]
+            items = source["$filter"]
+            match = items["cond"]["$regexMatch"]
+            regex = re.compile(match["regex"], re.IGNORECASE if "i" in match.get("options", "") else 0)
+            field = match["input"].split(".", 1)[1]
+            kept = [m for m in doc.get(items["input"].lstrip("$"), []) if regex.search(str(m.get(field, "")))]
+            result[key] = kept[:count]
+    return result
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict], projection: Optional[Dict] = None):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda d: (_get_path(d, field) is None, _get_path(d, field)),
+                            reverse=order == -1)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        docs = self._docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        for doc in docs:
+            yield _project(doc, self._projection)
+
+
+class FakeCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: Dict = {}
+        self._lock = threading.Lock()
+        self.indexes: Dict[str, Dict] = {}
+        self.op_counts: Dict[str, int] = {}
+
+    def _op(self, name: str):
+        self.op_counts[name] = self.op_counts.get(name, 0) + 1
+        with POOL.connection(name):
+            time.sleep(LATENCY.mongo_op)
+
+    def insert_one(self, document: Dict):
+        self._op("insert_one")
+        with self._lock:
+            document.setdefault("_id", ObjectId())
+            if document["_id"] in self._docs:
+                raise DuplicateKeyError(f"duplicate _id {document['_id']}", 11000)
+            self._docs[document["_id"]] = copy.deepcopy(document)
+        return _Result(inserted_id=document["_id"], acknowledged=True)
+
+    def insert_many(self, documents, ordered: bool = True):
+        self._op("insert_many")
+        inserted, errors = [], []
+        with self._lock:
+            for index, document in enumerate(documents):
+                document.setdefault("_id", ObjectId())
+                if document["_id"] in self._docs:
+                    errors.append({"index": index, "code": 11000})
+                    if ordered:
+                        break
+                    continue
+                self._docs[document["_id"]] = copy.deepcopy(document)
+                inserted.append(document["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return _Result(inserted_ids=inserted, acknowledged=True)
+
+    def _apply_update(self, doc: Dict, update: Dict, inserting: bool):
+        for op, fields in update.items():
+            for key, value in fields.items():
+                if op == "$set" or (op == "$setOnInsert" and inserting):
+                    doc[key] = copy.deepcopy(value)
+                elif op == "$push":
+                    items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                    doc.setdefault(key, []).extend(copy.deepcopy(items))
+                    if isinstance(value, dict) and "$slice" in value:
+                        doc[key] = doc[key][:value["$slice"]]
+                elif op == "$inc":
+                    doc[key] = doc.get(key, 0) + value
+                elif op == "$unset":
+                    doc.pop(key, None)
+
+    def update_one(self, filter: Dict, update: Dict, upsert: bool = False):
+        self._op("update_one")
+        with self._lock:
+            for doc in self._docs.values():
+                if _matches(doc, filter):
+                    self._apply_update(doc, update, inserting=False)
+                    return _Result(matched_count=1, modified_count=1, upserted_id=None)
+            if not upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=None)
+            doc = {k: copy.deepcopy(v) for k, v in filter.items() if not k.startswith("$")
+                   and not isinstance(v, dict) and "." not in k}
+            doc.setdefault("_id", ObjectId())
+            if doc["_id"] in self._docs:
+                raise DuplicateKeyError(f"duplicate _id {doc['_id']}", 11000)
+            self._apply_update(doc, update, inserting=True)
+            self._docs[doc["_id"]] = doc
+            return _Result(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+
+    def find_one(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None):
+        self._op("find_one")
+        with self._lock:
+            for doc in self._docs.values():
+                if _matches(doc, filter or {}):
+                    return _project(doc, projection)
+        return None
+
+    def find(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None, **kwargs):
+        self._op("find")
+        projection = {k: v for k, v in (projection or {}).items()
+                      if not (isinstance(v, dict) and "$meta" in v)}
+        with self._lock:
+            docs = [doc for doc in self._docs.values() if _matches(doc, filter or {})]
+        return FakeCursor(docs, projection)
+
+    def aggregate(self, pipeline: List[Dict], **kwargs):
+        self._op("aggregate")
+        with self._lock:
+            docs = copy.deepcopy(list(self._docs.values()))
+        scores = {}
+        for stage in pipeline:
+            if "$match" in stage:
+                docs = [d for d in docs if _matches(d, stage["$match"])]
+                if "$text" in stage["$match"]:
+                    scores = {id(d): _text_score(d, stage["$match"]["$text"]["$search"]) for d in docs}
+            elif "$sort" in stage:
+                for field, order in reversed(list(stage["$sort"].items())):
+                    if isinstance(order, dict):
+                        docs.sort(key=lambda d: scores.get(id(d), 0.0), reverse=True)
+                    else:
+                        docs.sort(key=lambda d: _get_path(d, field), reverse=order == -1)
+            elif "$sample" in stage:
+                docs = docs[:stage["$sample"]["size"]]
+            elif "$skip" in stage:
+                docs = docs[stage["$skip"]:]
+            elif "$limit" in stage:
+                docs = docs[:stage["$limit"]]
+            elif "$project" in stage:
+                docs = [_aggregate_project(d, stage["$project"], scores.get(id(d), 0.0)) for d in docs]
+        return iter(docs)
+
+    def delete_one(self, filter: Dict):
+        self._op("delete_one")
+        with self._lock:
+            for key, doc in list(self._docs.items()):
+                if _matches(doc, filter):
+                    del self._docs[key]
+                    return _Result(deleted_count=1)
+        return _Result(deleted_count=0)
+
+    def delete_many(self, filter: Dict):
+        self._op("delete_many")
+        with self._lock:
+            keys = [key for key, doc in self._docs.items() if _matches(doc, filter)]
+            for key in keys:
+                del self._docs[key]
+        return _Result(deleted_count=len(keys))
+
+    def count_documents(self, filter: Dict, **kwargs) -> int:
+        with self._lock:
+            return sum(1 for doc in self._docs.values() if _matches(doc, filter))
+
+    def estimated_document_count(self) -> int:
+        return len(self._docs)
+
+    def create_index(self, keys, **kwargs) -> str:
+        name = kwargs.get("name") or "_".join(f"{k}_{v}" for k, v in
+                                              (keys if isinstance(keys, list) else [(keys, 1)]))
+        self.indexes[name] = {"key": keys, **kwargs}
+        return name
+
+    def index_information(self) -> Dict:
+        return dict(self.indexes)
+
+    def drop_index(self, name: str):
+        self.indexes.pop(name, None)
+
+
+class FakeDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return self[name]
+
+    def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    def command(self, name, *args, **kwargs):
+        time.sleep(LATENCY.mongo_op)
+        if name == "collStats":
+            docs = self[args[0]]._docs.values()
+            size = sum(len(str(d)) for d in docs)
+            return {"count": len(docs), "size": size, "storageSize": size, "totalIndexSize": 0}
+        return {"ok": 1.0}
+
+
+class _FakePool:
+    """Connection pool bounded by maxPoolSize that reports to the client's event listeners"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.configure({})
+
+    def configure(self, options: Dict):
+        self.listeners = options.get("event_listeners") or []
+        self._slots = threading.BoundedSemaphore(options.get("maxPoolSize") or 100)
+        self._idle = 0
+
+    def _emit(self, method: str, **fields):
+        event = SimpleNamespace(**fields)
+        for listener in self.listeners:
+            if hasattr(listener, method):
+                getattr(listener, method)(event)
+
+    @contextmanager
+    def connection(self, command: str):
+        slots = self._slots
+        self._emit("connection_check_out_started")
+        slots.acquire()
+        with self._lock:
+            created = self._idle == 0
+            self._idle = max(0, self._idle - 1)
+        if created:
+            self._emit("connection_created")
+        self._emit("connection_checked_out")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._emit("succeeded", command_name=command, duration_micros=int((time.perf_counter() - start) * 1e6))
+            self._emit("connection_checked_in")
+            with self._lock:
+                self._idle += 1
+            slots.release()
+
+
+POOL = _FakePool()
+
+
+class FakeMongoClient:
+    """Drop-in for pymongo.MongoClient backed by process memory"""
+
+    _databases: Dict[str, FakeDatabase] = {}
+
+    def __init__(self, *args, **kwargs):
+        self.options = kwargs
+        POOL.configure(kwargs)
+
+    def __getattr__(self, name: str) -> FakeDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_database(name)
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        return self.get_database(name)
+
+    def get_database(self, name: str = "chat_history", **kwargs) -> FakeDatabase:
+        if name not in self._databases:
+            self._databases[name] = FakeDatabase(name)
+        return self._databases[name]
+
+    def close(self):
+        pass
+
+    @classmethod
+    def reset(cls):
+        cls._databases.clear()
+
+
+# ------------------------------------------------------------------ patching
+
+FAKE_SECRETS = {
+    "ANTHROPIC_API_KEY": "fake-anthropic-key",
+    "ELEVENLABS_API_KEY": "fake-elevenlabs-key",
+    "MONGODB_URI": "mongodb://fake.invalid:27017",
+}
+
+
+@contextmanager
+def offline_services(latency: Optional[FakeLatency] = None, llm_url: Optional[str] = None):
+    """Patch the Anthropic, ElevenLabs and MongoDB entry points the apps use
+
+    With `llm_url` the real Anthropic SDK is kept and pointed at a FakeLLMServer.
+    """
+    global LATENCY
+    previous = LATENCY
+    if latency is not None:
+        LATENCY = latency
+    if llm_url:
+        llm_patch = mock.patch.dict("os.environ", {"ANTHROPIC_BASE_URL": llm_url})
+    else:
+        llm_patch = mock.patch("anthropic.Anthropic", FakeAnthropic)
+    patches = [
+        llm_patch,
+        mock.patch("elevenlabs.generate", fake_generate),
+        mock.patch("elevenlabs.set_api_key", lambda key: None),
+        mock.patch("pymongo.MongoClient", FakeMongoClient),
+        mock.patch.dict("os.environ", FAKE_SECRETS),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        yield
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+        LATENCY = previous
+
+
+def synthetic_history(length: int) -> List[Dict]:
+    """A deterministic user/assistant transcript with `length` messages"""
+    history = []
+    for i in range(length):
+        role = "user" if i % 2 == 0 else "assistant"
+        content = (f"Message {i}: " + " ".join(REPLY_WORDS[(i + j) % len(REPLY_WORDS)] for j in range(30)))
+        history.append({"role": role, "content": content, "timestamp": datetime.now()})
+    return history
@@ -0,0 +1,120 @@
+import os
+import random
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Canned replies are only used when the whole message is explained by one intent
+FAST_PATH_ENABLED = os.getenv("FAST_PATH", "1") == "1"
+MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.9"))
+# Longer messages always go to the LLM
+MAX_WORDS = 8
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+# intent -> (anchor words, one of which must appear; words that may accompany them)
+_FILLER = {"i", "im", "i'm", "am", "so", "soo", "sooo", "really", "very", "feel", "feeling", "today",
+           "day", "was", "is", "a", "the", "it", "had", "have", "been", "just", "kinda", "pretty", "such"}
+LEXICON: Dict[str, Tuple[set, set]] = {
+    "greeting": (
+        {"hi", "hey", "heyy", "hello", "hiya", "heya", "howdy", "yo", "sup", "morning", "evening", "afternoon"},
+        {"there", "good", "babe", "baby", "sweetie", "honey", "love", "how", "are", "you", "u", "r", "doing",
+         "whats", "what's", "up", "going", "is", "it", "your", "day", "today", "again", "coach"},
+    ),
+    "happy": (
+        {"happy", "excited", "amazing", "awesome", "yay", "wonderful", "fantastic", "great", "thrilled"},
+        _FILLER,
+    ),
+    "sad": (
+        {"sad", "down", "tired", "lonely", "upset", "depressed", "awful", "terrible", "stressed",
+         "exhausted", "crying", "miss", "bad"},
+        _FILLER | {"you", "out", "of", "sorts", "today"},
+    ),
+}
+
+# Bare acknowledgements ("yes", "ok", "lol") are deliberately absent: what they
+# mean depends on what was said before, which a canned line cannot know.
+
+# intent -> persona line lists to answer from, first one present wins
+# (aigf personalities have happy/sad/neutral, coach personalities supportive/challenging/neutral)
+INTENT_LINES = {
+    "greeting": ("greetings",),
+    "happy": ("happy",),
+    "sad": ("sad",),
+}
+
+# A mood word in a question ("is it bad", "are you sad?") is not a statement of mood
+_QUESTION_WORDS = {"is", "are", "am", "was", "were", "do", "does", "did", "can", "could", "should", "would",
+                   "will", "why", "what", "how", "when", "where", "who"}
+
+
+def classify(text: str) -> Tuple[Optional[str], float]:
+    """Best matching intent and the share of the message's words it explains"""
+    words = _WORD_RE.findall(text.lower())
+    if not words or len(words) > MAX_WORDS:
+        return None, 0.0
+    question = "?" in text or words[0] in _QUESTION_WORDS
+    best, best_score = None, 0.0
+    for intent, (anchors, companions) in LEXICON.items():
+        if not any(word in anchors for word in words):
+            continue
+        if question and intent != "greeting":
+            continue
+        score = sum(1 for word in words if word in anchors or word in companions) / len(words)
+        if score > best_score:
+            best, best_score = intent, score
+    return best, best_score
+
+
+def persona_lines(personality: Dict) -> Dict[str, List[str]]:
+    """Greeting and response lines from either personality format, quotes stripped"""
+    style = personality.get("conversation_style") or personality.get("coaching_style", {}).get("conversation_style", {})
+    lines = {"greetings": style.get("greetings", [])}
+    lines.update(style.get("responses", {}))
+    return {key: [line.strip().strip('"') for line in values if line.strip()] for key, values in lines.items()}
+
+
+def canned_reply(text: str, personality: Optional[Dict], previous: Optional[str] = None,
+                 intents: Iterable[str] = INTENT_LINES) -> Optional[str]:
+    """A persona-authored reply when the message is confidently a simple opener or reaction, else None
+
+    `previous` is the last assistant message, None at the start of a conversation.
+    Greetings are only answered at the start, and nothing is answered after a
+    question from the assistant, whose answer a canned line would ignore.
+    """
+    if not FAST_PATH_ENABLED or not personality:
+        return None
+    if previous is not None and previous.rstrip().endswith("?"):
+        return None
+    intent, confidence = classify(text)
+    if intent is None or intent not in intents or confidence < MIN_CONFIDENCE:
+        return None
+    if intent == "greeting" and previous is not None:
+        return None
+    lines = persona_lines(personality)
+    for key in INTENT_LINES[intent]:
+        choices = [line for line in lines.get(key, []) if line != previous]
+        if choices:
+            return random.choice(choices)
+    return None
+
+
+def all_lines(personality: Dict, intents: Iterable[str] = INTENT_LINES) -> List[str]:
+    """Every line the fast path can answer with"""
+    lines = persona_lines(personality)
+    return [line for intent in intents for key in INTENT_LINES[intent] for line in lines.get(key, [])]
+
+
+def start_presynthesis(lines: List[str], synthesize: Callable[[str], None]) -> threading.Thread:
+    """Synthesize canned lines in the background so their audio is cached before first use"""
+    def run():
+        for line in lines:
+            try:
+                synthesize(line)
+            except Exception:
+                # Missing audio only means this line is synthesized when first spoken
+                pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
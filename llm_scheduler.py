@@ -0,0 +1,283 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from core import lazy_import
+
+anthropic = lazy_import("anthropic")
+
+# Account quota shared by every session in this process
+LLM_RPM = float(os.getenv("LLM_RPM", "50"))
+LLM_TPM = float(os.getenv("LLM_TPM", "40000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+# Backoff bounds (seconds) for retries
+RETRY_BASE = 1.0
+RETRY_CAP = 30.0
+# Retried like the SDK does: timeouts, conflicts, rate limits, server errors and overload;
+# connection errors and timeouts without a response are retried too
+RETRY_STATUS = (408, 409, 429, 500, 502, 503, 504, 529)
+
+# Lower runs first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+
+class TokenBucket:
+    """Continuously refilling budget of `per_minute` units, holding at most a minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if now)"""
+        self._refill()
+        # A request bigger than the bucket goes through once the bucket is full
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.available -= amount
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+
+def estimate_tokens(request: Dict) -> int:
+    """Input estimate (~4 characters per token) plus the full output allowance"""
+    chars = len(str(request.get("system", "")))
+    for message in request.get("messages", []):
+        chars += len(str(message.get("content", "")))
+    return chars // 4 + int(request.get("max_tokens", 0))
+
+
+def _request_key(request: Dict) -> str:
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRY_STATUS
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Backoff for a retryable error, or None if it should not be retried"""
+    if not _retryable(error) or attempt >= LLM_MAX_RETRIES:
+        return None
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        floor = float(retry_after) if retry_after else 0.0
+    except ValueError:
+        floor = 0.0
+    # Full jitter keeps sessions that were throttled together from retrying together
+    return max(floor, random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt)))
+
+
+class LLMScheduler:
+    """Admits LLM calls in priority order within requests-per-minute and tokens-per-minute budgets
+
+    Identical non-streaming requests already in flight share one API call.
+    Rate limits, overload, server and connection errors are retried with
+    jittered backoff, and a 429's retry-after pauses admission for every
+    caller, not just the one that was throttled.
+    """
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._in_flight: Dict[str, Future] = {}
+        self.stats = {"admitted": 0, "retries": 0, "rate_limited": 0, "deduplicated": 0,
+                      "queued_seconds": 0.0}
+
+    def acquire(self, estimated_tokens: int, priority: int = INTERACTIVE):
+        """Block until this call may go out; higher priority and earlier callers go first"""
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if self._queue[0] == ticket:
+                        wait = max(self._paused_until - time.monotonic(),
+                                   self.requests.wait_time(1),
+                                   self.tokens.wait_time(estimated_tokens))
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(wait)
+                self.requests.take(1)
+                self.tokens.take(estimated_tokens)
+                self.stats["admitted"] += 1
+                self.stats["queued_seconds"] += time.monotonic() - start
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def settle(self, estimated_tokens: int, usage):
+        """Return the unused part of a token reservation once real usage is known"""
+        if usage is None:
+            return
+        used = (getattr(usage, "input_tokens", 0) or 0) + (getattr(usage, "output_tokens", 0) or 0)
+        with self._cond:
+            self.tokens.give_back(max(0, estimated_tokens - used))
+            self._cond.notify_all()
+
+    def backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        """Delay before retrying `error`, pausing admission meanwhile; None means give up"""
+        delay = _retry_delay(error, attempt)
+        if delay is None:
+            return None
+        with self._cond:
+            self.stats["retries"] += 1
+            if getattr(error, "status_code", None) == 429:
+                self.stats["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+        return delay
+
+    def create(self, client, priority: int = INTERACTIVE, **request):
+        """messages.create through the scheduler, sharing identical in-flight requests"""
+        key = _request_key(request)
+        with self._cond:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.stats["deduplicated"] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            estimate = estimate_tokens(request)
+            for attempt in itertools.count():
+                self.acquire(estimate, priority)
+                try:
+                    response = client.messages.create(**request)
+                    break
+                except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                    delay = self.backoff(e, attempt)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+            self.settle(estimate, response.usage)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                self._in_flight.pop(key, None)
+
+    def stream(self, client, priority: int = INTERACTIVE, **request) -> "_ScheduledStream":
+        """messages.stream through the scheduler; retries only before any text has arrived"""
+        return _ScheduledStream(self, client, priority, request)
+
+
+class _ScheduledStream:
+    """Context manager wrapping messages.stream with admission, retry and token settlement"""
+
+    def __init__(self, scheduler: LLMScheduler, client, priority: int, request: Dict):
+        self._scheduler = scheduler
+        self._client = client
+        self._priority = priority
+        self._request = request
+        self._estimate = estimate_tokens(request)
+        self._manager = None
+        self._stream = None
+
+    def __enter__(self):
+        for attempt in itertools.count():
+            self._scheduler.acquire(self._estimate, self._priority)
+            try:
+                # The HTTP request is sent on enter, so errors surface before any text
+                self._manager = self._client.messages.stream(**self._request)
+                self._stream = self._manager.__enter__()
+                return self._stream
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                delay = self._scheduler.backoff(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def __exit__(self, exc_type, exc, tb):
+        usage = None
+        if exc_type is None:
+            try:
+                usage = self._stream.get_final_message().usage
+            except Exception:
+                pass
+        self._scheduler.settle(self._estimate, usage)
+        return self._manager.__exit__(exc_type, exc, tb)
+
+
+class ScheduledClient:
+    """Stand-in for anthropic.Anthropic whose messages calls go through the scheduler"""
+
+    def __init__(self, client, scheduler: LLMScheduler, priority: int = INTERACTIVE):
+        self._client = client
+        self.messages = _ScheduledMessages(client, scheduler, priority)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _ScheduledMessages:
+    def __init__(self, client, scheduler: LLMScheduler, priority: int):
+        self._client = client
+        self._scheduler = scheduler
+        self._priority = priority
+
+    def create(self, priority: Optional[int] = None, **request):
+        return self._scheduler.create(self._client, self._priority if priority is None else priority, **request)
+
+    def stream(self, priority: Optional[int] = None, **request):
+        return self._scheduler.stream(self._client, self._priority if priority is None else priority, **request)
+
+    def __getattr__(self, name):
+        return getattr(self._client.messages, name)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Return the process-wide scheduler shared by every session and app"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+
+def scheduled_client(api_key: Optional[str] = None, priority: int = INTERACTIVE) -> ScheduledClient:
+    """An Anthropic client whose calls are rate limited, prioritised and retried by the scheduler"""
+    # The scheduler does the retrying; SDK retries would bypass the rate limiter
+    client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+    return ScheduledClient(client, get_scheduler(), priority)
@@ -0,0 +1,192 @@
+"""Concurrent-session load generator for aigf_prod.py and coach.py.
+
+Simulated users run as AppTest sessions inside worker processes. Each worker
+keeps all of its sessions alive at once, the way one Streamlit server process
+holds every connected browser tab, and steps them through a scripted
+conversation in turn. The real Anthropic SDK is used against a local
+FakeLLMServer with a configurable token rate; ElevenLabs and MongoDB use the
+in-process fakes.
+
+    python loadgen.py --app aigf_prod --users 50 --workers 4 --token-rate 80
+    python loadgen.py --app coach --users 200 --workers 8 --script convo.json --json load.json
+
+A script file is a JSON list of user messages.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import fakes
+from benchmark import APP_DIR, APPS, new_session, percentile, send_turn
+
+DEFAULT_SCRIPT = [
+    "Hi! How are you doing today?",
+    "I had a long day at work, a lot of meetings.",
+    "What would you suggest I do to unwind this evening?",
+    "That sounds nice. Can you tell me a bit more about that?",
+    "Thanks, I appreciate it.",
+    "By the way, what did you do today?",
+    "Let's talk again tomorrow. Good night!",
+]
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak RSS (KB on Linux) where /proc is unavailable
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _worker_ready(_) -> int:
+    # Import the apps' dependencies so start-up cost is not measured
+    import anthropic, elevenlabs, pymongo, streamlit  # noqa: F401
+    return os.getpid()
+
+
+def run_worker(app: str, users: int, script: List[str], llm_url: str,
+               think_time: float, seed: int) -> Dict:
+    """Host `users` sessions in this process and drive them through `script`"""
+    os.chdir(APP_DIR)
+    rng = random.Random(seed)
+    latencies, errors, error_samples = [], 0, []
+
+    with fakes.offline_services(llm_url=llm_url):
+        # One throwaway session so first-run imports and caches are not per-session cost
+        send_turn(new_session(app), app, script[0])
+        baseline_rss = rss_bytes()
+        cpu_start = cpu_seconds()
+        start = time.perf_counter()
+
+        sessions = []
+        for _ in range(users):
+            try:
+                sessions.append(new_session(app))
+            except Exception as e:
+                errors += 1
+                error_samples.append(f"session start: {e}")
+        open_rss = rss_bytes()
+
+        # Round-robin: every live session sends its next scripted message
+        for text in script:
+            for at in sessions:
+                try:
+                    latencies.append(send_turn(at, app, text))
+                except Exception as e:
+                    errors += 1
+                    if len(error_samples) < 5:
+                        error_samples.append(str(e))
+                if think_time:
+                    time.sleep(rng.uniform(0, think_time))
+
+        wall = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_start
+        final_rss = rss_bytes()
+
+    return {
+        "pid": os.getpid(),
+        "sessions": len(sessions),
+        "latencies": latencies,
+        "errors": errors,
+        "error_samples": error_samples,
+        "cpu_seconds": cpu,
+        "wall_seconds": wall,
+        "baseline_rss": baseline_rss,
+        "open_rss": open_rss,
+        "final_rss": final_rss,
+    }
+
+
+def summarize(app: str, results: List[Dict], llm_requests: int, wall: float) -> Dict:
+    latencies = [t for r in results for t in r["latencies"]]
+    sessions = sum(r["sessions"] for r in results) or 1
+    grown = sum(r["final_rss"] - r["baseline_rss"] for r in results)
+    opened = sum(r["open_rss"] - r["baseline_rss"] for r in results)
+    cpu = sum(r["cpu_seconds"] for r in results)
+    return {
+        "app": app,
+        "workers": len(results),
+        "sessions": sessions,
+        "turns": len(latencies),
+        "errors": sum(r["errors"] for r in results),
+        "error_samples": [e for r in results for e in r["error_samples"]][:5],
+        "llm_requests": llm_requests,
+        "rerun_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "rerun_p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "rerun_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "rerun_mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "turns_per_sec": round(len(latencies) / wall, 2) if wall else 0.0,
+        "cpu_seconds": round(cpu, 2),
+        "cpu_ms_per_turn": round(cpu * 1000 / len(latencies), 2) if latencies else 0.0,
+        "rss_per_open_session_kb": round(opened / sessions / 1024, 1),
+        "rss_per_session_kb": round(grown / sessions / 1024, 1),
+        "worker_rss_mb": [round(r["final_rss"] / 2 ** 20, 1) for r in results],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load generator")
+    parser.add_argument("--app", default="aigf_prod", choices=[app for app in APPS if APPS[app]["input"] == "chat"])
+    parser.add_argument("--users", type=int, default=20, help="simulated concurrent users")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes")
+    parser.add_argument("--script", help="JSON file with the list of user messages")
+    parser.add_argument("--token-rate", type=float, default=0.0,
+                        help="fake LLM output tokens per second (0 = instant)")
+    parser.add_argument("--ttft", type=float, default=0.0, help="fake LLM time to first token (s)")
+    parser.add_argument("--think-time", type=float, default=0.0,
+                        help="max random pause after each user turn (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args(argv)
+
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            script = json.load(f)
+
+    server = fakes.FakeLLMServer(args.ttft, args.token_rate).start()
+    workers = max(1, min(args.workers, args.users))
+    share = [args.users // workers + (1 if i < args.users % workers else 0) for i in range(workers)]
+
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            list(pool.map(_worker_ready, range(workers)))
+            start = time.perf_counter()
+            futures = [
+                pool.submit(run_worker, args.app, users, script, server.url, args.think_time, args.seed + i)
+                for i, users in enumerate(share)
+            ]
+            results = [f.result() for f in futures]
+            wall = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    summary = summarize(args.app, results, server.requests, wall)
+    for key, value in summary.items():
+        print(f"{key:>24}: {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    # AppTest swaps out sys.modules["__main__"], so run via the importable module
+    from loadgen import main
+    sys.exit(main())
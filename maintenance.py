@@ -0,0 +1,219 @@
+"""Retention and compaction job for chat_history.conversations.
+
+    python maintenance.py                      # apply the policy from the environment
+    python maintenance.py --dry-run            # only report what would change
+    python maintenance.py --archive-days 30 --cold-ttl-days 365 --compact
+
+Each run:
+  1. deletes empty conversation stubs older than a grace period (sessions that
+     were opened but never used),
+  2. moves conversations with no message since the archive cutoff into a cold
+     collection, compacted to role/content pairs, in batches; a conversation
+     resumed after it was archived is merged into its cold copy,
+  3. makes sure the supporting indexes exist, including a TTL index that
+     expires archived conversations after the cold retention period,
+  4. reports document, data and index sizes before and after via collStats.
+
+Run it from cron or any scheduler; every step is safe to repeat.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+# Stubs younger than this may belong to a session that is about to send its first message
+EMPTY_GRACE_MINUTES = float(os.getenv("RETENTION_EMPTY_GRACE_MINUTES", "60"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("RETENTION_ARCHIVE_DAYS", "90"))
+# 0 keeps archived conversations forever
+COLD_TTL_DAYS = float(os.getenv("RETENTION_COLD_TTL_DAYS", "0"))
+COLD_COLLECTION = "conversations_archive"
+BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+EMPTY_FILTER = {"$or": [{"messages": {"$exists": False}}, {"messages": {"$size": 0}}]}
+
+
+def collection_stats(db, name: str) -> Dict[str, int]:
+    """Document count and data/storage/index sizes in bytes"""
+    try:
+        stats = db.command("collStats", name)
+    except Exception:
+        # Collection does not exist yet
+        return {"count": 0, "size": 0, "storageSize": 0, "totalIndexSize": 0}
+    return {key: int(stats.get(key, 0)) for key in ("count", "size", "storageSize", "totalIndexSize")}
+
+
+def ensure_indexes(db, cold_ttl_days: float = COLD_TTL_DAYS):
+    """Indexes the sidebar, the retention queries and the cold TTL rely on"""
+    db.conversations.create_index([("timestamp", -1)], name="timestamp_desc")
+    db.conversations.create_index([("updated_at", 1)], name="updated_at")
+    cold = db[COLD_COLLECTION]
+    cold.create_index([("timestamp", -1)], name="timestamp_desc")
+    if cold_ttl_days > 0:
+        expire = int(cold_ttl_days * 86400)
+        try:
+            cold.create_index([("archived_at", 1)], name="archived_at_ttl", expireAfterSeconds=expire)
+        except Exception:
+            # The TTL changed: update the existing index in place
+            db.command("collMod", COLD_COLLECTION,
+                       index={"name": "archived_at_ttl", "expireAfterSeconds": expire})
+    elif "archived_at_ttl" in cold.index_information():
+        cold.drop_index("archived_at_ttl")
+
+
+def delete_empty_stubs(db, grace_minutes: float = EMPTY_GRACE_MINUTES, dry_run: bool = False) -> int:
+    query = {"$and": [EMPTY_FILTER, {"timestamp": {"$lt": datetime.now() - timedelta(minutes=grace_minutes)}}]}
+    if dry_run:
+        return db.conversations.count_documents(query)
+    return db.conversations.delete_many(query).deleted_count
+
+
+def inactive_filter(cutoff: datetime) -> Dict:
+    """Conversations with no message since `cutoff`
+
+    `updated_at` is kept by chat_storage.save_message; conversations written
+    before it existed fall back to their message timestamps.
+    """
+    return {"$or": [
+        {"updated_at": {"$lt": cutoff}},
+        {"updated_at": {"$exists": False}, "timestamp": {"$lt": cutoff},
+         "messages.timestamp": {"$not": {"$gte": cutoff}}},
+    ]}
+
+
+def compact_messages(document: Dict) -> List[Dict]:
+    """Messages reduced to role/content, keeping the message ID when there is one"""
+    return [{key: m[key] for key in ("id", "role", "content") if key in m} for m in document.get("messages", [])]
+
+
+def compact_conversation(document: Dict, archived_at: datetime) -> Dict:
+    """Cold copy of a conversation: per-message timestamps and session fields dropped"""
+    messages = compact_messages(document)
+    return {
+        "_id": document["_id"],
+        "timestamp": document.get("timestamp"),
+        "archived_at": archived_at,
+        "message_count": len(messages),
+        "messages": messages,
+    }
+
+
+def merge_into_archive(cold, document: Dict, archived_at: datetime) -> int:
+    """Append the messages of a conversation resumed after archiving to its cold copy
+
+    Messages the cold copy already has (merged by an interrupted run) are
+    skipped by ID. Returns the cold copy's message count before the merge.
+    """
+    archived = cold.find_one({"_id": document["_id"]}, {"messages": 1, "message_count": 1})
+    stored = {m.get("id") for m in archived.get("messages", []) if m.get("id")}
+    messages = [m for m in compact_messages(document) if m.get("id") not in stored]
+    cold.update_one({"_id": document["_id"]}, {
+        "$push": {"messages": {"$each": messages}},
+        "$set": {"archived_at": archived_at, "message_count": archived["message_count"] + len(messages)},
+    })
+    return archived["message_count"]
+
+
+def restore_archive(cold, conversation_id, previous_count: Optional[int]):
+    """Undo this run's copy of a conversation that got a message before it was deleted
+
+    `previous_count` is the cold copy's message count before a merge, or None
+    if the copy was inserted by this run.
+    """
+    if previous_count is None:
+        cold.delete_one({"_id": conversation_id})
+        return
+    cold.update_one({"_id": conversation_id}, {
+        "$push": {"messages": {"$each": [], "$slice": previous_count}},
+        "$set": {"message_count": previous_count},
+    })
+
+
+def archive_old_conversations(db, archive_days: float = ARCHIVE_AFTER_DAYS,
+                              batch_size: int = BATCH_SIZE, dry_run: bool = False) -> int:
+    """Copy inactive conversations to the cold collection, then delete them; returns how many moved"""
+    query = inactive_filter(datetime.now() - timedelta(days=archive_days))
+    if dry_run:
+        return db.conversations.count_documents(query)
+
+    cold = db[COLD_COLLECTION]
+    moved = 0
+    while True:
+        batch = list(db.conversations.find(query).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return moved
+        archived_at = datetime.now()
+        # _id -> cold message count before this run merged into it (None: inserted by this run)
+        previous = {d["_id"]: None for d in batch}
+        try:
+            cold.insert_many([compact_conversation(d, archived_at) for d in batch], ordered=False)
+        except BulkWriteError as e:
+            # A cold copy exists (archived before, then resumed); anything else must not be deleted
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+            for error in e.details["writeErrors"]:
+                document = batch[error["index"]]
+                previous[document["_id"]] = merge_into_archive(cold, document, archived_at)
+        ids = list(previous)
+        # A message saved since the batch was read makes the conversation active again: keep it hot
+        moved += db.conversations.delete_many({"$and": [query, {"_id": {"$in": ids}}]}).deleted_count
+        for survivor in db.conversations.find({"_id": {"$in": ids}}, {"_id": 1}):
+            restore_archive(cold, survivor["_id"], previous[survivor["_id"]])
+
+
+def run(db, archive_days: float = ARCHIVE_AFTER_DAYS, grace_minutes: float = EMPTY_GRACE_MINUTES,
+        cold_ttl_days: float = COLD_TTL_DAYS, compact: bool = False, dry_run: bool = False) -> Dict:
+    start = time.perf_counter()
+    before = collection_stats(db, "conversations")
+    if not dry_run:
+        ensure_indexes(db, cold_ttl_days)
+    deleted = delete_empty_stubs(db, grace_minutes, dry_run)
+    archived = archive_old_conversations(db, archive_days, dry_run=dry_run)
+    if compact and not dry_run:
+        # Deleted space is reused by WiredTiger but only returned to the OS by compact
+        db.command("compact", "conversations")
+    after = collection_stats(db, "conversations")
+    return {
+        "dry_run": dry_run,
+        "empty_deleted": deleted,
+        "archived": archived,
+        "before": before,
+        "after": after,
+        "reclaimed_bytes": {
+            key: before[key] - after[key] for key in ("size", "storageSize", "totalIndexSize")
+        },
+        "cold": collection_stats(db, COLD_COLLECTION),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Delete empty stubs and archive old conversations")
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI"), help="defaults to MONGODB_URI")
+    parser.add_argument("--db", default="chat_history")
+    parser.add_argument("--archive-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--grace-minutes", type=float, default=EMPTY_GRACE_MINUTES)
+    parser.add_argument("--cold-ttl-days", type=float, default=COLD_TTL_DAYS,
+                        help="expire archived conversations after this many days (0 = never)")
+    parser.add_argument("--compact", action="store_true", help="run compact to return freed space to the OS")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.uri:
+        parser.error("no MongoDB URI: pass --uri or set MONGODB_URI")
+    db = MongoClient(args.uri).get_database(args.db)
+    report = run(db, args.archive_days, args.grace_minutes, args.cold_ttl_days, args.compact, args.dry_run)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
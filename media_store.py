@@ -0,0 +1,396 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlparse
+
+# Content-addressed audio cache served over plain HTTP
+MEDIA_DIR = Path(os.getenv("MEDIA_DIR", ".media_cache"))
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(512 * 1024 * 1024)))
+MEDIA_PORT = int(os.getenv("MEDIA_PORT", "8765"))
+# Public URL prefix the browser uses to reach the media server (e.g. behind a proxy).
+# Without it the server is not started and audio is inlined into the page, since
+# a guessed localhost URL only works for a browser on the server host.
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL")
+# Interface the media server listens on; by default the host of MEDIA_BASE_URL when
+# it names MEDIA_PORT directly, else localhost for a reverse proxy on this host
+MEDIA_BIND_HOST = os.getenv("MEDIA_BIND_HOST")
+
+CONTENT_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "ogg": "audio/ogg"}
+_NAME_RE = re.compile(r"^([0-9a-f]{64})\.(\w+)$")
+_PATH_RE = re.compile(r"^/media/([0-9a-f]{64})\.(\w+)$")
+_STREAM_RE = re.compile(r"^/stream/([0-9a-f]{32})\.(\w+)$")
+# Finished streams are kept this long so late requests can be redirected to the stored file
+STREAM_TTL = 300
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class AudioStream:
+    """Audio chunks from a streaming TTS call, readable while they are still arriving"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.name = None
+        self.error = None
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    def feed(self, chunk: bytes):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, name: Optional[str] = None, error: Optional[Exception] = None):
+        with self._cond:
+            self.name = name
+            self.error = error
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def iter_chunks(self, timeout: float = 30.0) -> Iterator[bytes]:
+        """Yield every chunk, blocking for new ones until the stream is done"""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    if not self._cond.wait(timeout):
+                        return
+                pending = self.chunks[index:]
+                done = self.done
+            index += len(pending)
+            yield from pending
+            if done and index >= len(self.chunks):
+                return
+
+
+class MediaStore:
+    """Audio files on disk keyed by the SHA-256 of their bytes, evicted LRU by total size
+
+    Several workers on a host may share the directory, so file modification
+    times record use and every new file triggers a rescan: eviction then sees
+    all workers' files, keeps their combined size under the budget, and drops
+    the least recently used across all of them. Synthesis keys are saved as
+    small files under aliases/, so stored audio is found again after a restart
+    and by every worker.
+    """
+
+    def __init__(self, root: Path = MEDIA_DIR, max_bytes: int = MEDIA_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._alias_dir = self.root / "aliases"
+        self._alias_dir.mkdir(exist_ok=True)
+        self._lock = threading.Lock()
+        # name -> size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        # synthesis key (text + voice) -> stored name, so repeated lines skip TTS
+        self._aliases: "OrderedDict[str, str]" = OrderedDict()
+        self._streams = {}
+        self.base_url = None
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the index from the directory, oldest use first"""
+        existing = []
+        for path in self.root.iterdir():
+            if not _NAME_RE.match(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Evicted by another worker meanwhile
+                continue
+            existing.append((stat.st_mtime, path.name, stat.st_size))
+        self._index = OrderedDict((name, size) for _, name, size in sorted(existing))
+        self._total = sum(self._index.values())
+
+    def _known(self, name: str) -> bool:
+        """Whether a file is stored, picking up one another worker stored since the last scan"""
+        if name not in self._index:
+            try:
+                size = (self.root / name).stat().st_size
+            except FileNotFoundError:
+                return False
+            self._index[name] = size
+            self._total += size
+        self._index.move_to_end(name)
+        return True
+
+    def _alias_path(self, alias: str) -> Path:
+        return self._alias_dir / hashlib.sha256(alias.encode("utf-8")).hexdigest()
+
+    def _remember(self, alias: str, name: str):
+        self._aliases[alias] = name
+        self._aliases.move_to_end(alias)
+        while len(self._aliases) > 4096:
+            self._aliases.popitem(last=False)
+
+    def _touch(self, name: str):
+        """Mark a file as used for the other workers sharing the directory"""
+        try:
+            os.utime(self.root / name)
+        except FileNotFoundError:
+            pass
+
+    def put(self, data: bytes, ext: str = "mp3", alias: Optional[str] = None) -> str:
+        """Store bytes (once per content) and return the file name"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        with self._lock:
+            if name not in self._index:
+                path = self.root / name
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._scan()
+            else:
+                self._touch(name)
+            self._index.move_to_end(name)
+            if alias:
+                self._remember(alias, name)
+                path = self._alias_path(alias)
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.write_text(name, encoding="utf-8")
+                os.replace(tmp_path, path)
+            self._collect()
+        return name
+
+    def lookup(self, alias: str) -> Optional[str]:
+        """Stored name for a synthesis key, if its audio is still cached"""
+        with self._lock:
+            name = self._aliases.get(alias)
+        if name is None:
+            try:
+                name = self._alias_path(alias).read_text(encoding="utf-8")
+            except OSError:
+                return None
+            if not _NAME_RE.match(name):
+                return None
+        with self._lock:
+            if not self._known(name):
+                return None
+            self._remember(alias, name)
+        if not (self.root / name).exists():
+            return None
+        self._touch(name)
+        return name
+
+    def path(self, name: str) -> Optional[Path]:
+        """Path of a stored file, marking it as recently used"""
+        with self._lock:
+            if not self._known(name):
+                return None
+        self._touch(name)
+        return self.root / name
+
+    def read(self, name: str) -> Optional[bytes]:
+        path = self.path(name)
+        return path.read_bytes() if path else None
+
+    def url(self, name: str) -> Optional[str]:
+        """Browser URL for a stored file, or None when the media server is not running"""
+        if not self.base_url:
+            return None
+        return f"{self.base_url}/media/{name}"
+
+    def start_stream(self, chunks: Iterator[bytes], ext: str = "mp3", alias: Optional[str] = None) -> str:
+        """Consume a chunked TTS response in the background; returns the stream id
+
+        The stream is playable from stream_url() while it downloads, and is
+        stored like put() once complete.
+        """
+        stream_id = uuid.uuid4().hex
+        stream = AudioStream()
+        with self._lock:
+            now = time.monotonic()
+            for old_id in [sid for sid, s in self._streams.items()
+                           if s.done and now - s.finished_at > STREAM_TTL]:
+                del self._streams[old_id]
+            self._streams[stream_id] = stream
+
+        def consume():
+            try:
+                for chunk in chunks:
+                    if chunk:
+                        stream.feed(chunk)
+                stream.finish(self.put(b"".join(stream.chunks), ext, alias))
+            except Exception as e:
+                stream.finish(error=e)
+
+        threading.Thread(target=consume, daemon=True).start()
+        return stream_id
+
+    def get_stream(self, stream_id: str) -> Optional[AudioStream]:
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def stream_url(self, stream_id: str, ext: str = "mp3") -> Optional[str]:
+        if not self.base_url:
+            return None
+        return f"{self.base_url}/stream/{stream_id}.{ext}"
+
+    def _collect(self):
+        """Drop least recently used files until under the size budget, and aliases of dropped files"""
+        evicted = False
+        while self._total > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            evicted = True
+            try:
+                (self.root / name).unlink()
+            except FileNotFoundError:
+                pass
+        if not evicted:
+            return
+        for path in self._alias_dir.iterdir():
+            try:
+                if path.read_text(encoding="utf-8") not in self._index:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    """GET/HEAD /media/<sha256>.<ext> with long-lived cache headers and byte ranges"""
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head: bool):
+        stream_match = _STREAM_RE.match(self.path.split("?", 1)[0])
+        if stream_match:
+            self._serve_stream(stream_match.group(1), stream_match.group(2), head)
+            return
+
+        match = _PATH_RE.match(self.path.split("?", 1)[0])
+        path = self.server.store.path(f"{match.group(1)}.{match.group(2)}") if match else None
+        if path is None or not path.exists():
+            self.send_error(404)
+            return
+
+        etag = f'"{match.group(1)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        status = 200
+        range_match = _RANGE_RE.match(self.headers.get("Range", ""))
+        if range_match and (range_match.group(1) or range_match.group(2)):
+            if range_match.group(1):
+                start = int(range_match.group(1))
+                end = int(range_match.group(2)) if range_match.group(2) else size - 1
+            else:
+                start = max(0, size - int(range_match.group(2)))
+            end = min(end, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES.get(match.group(2), "application/octet-stream"))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        self.send_header("ETag", etag)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _serve_stream(self, stream_id: str, ext: str, head: bool):
+        """Send audio as it is synthesized; once stored, redirect to the cacheable file"""
+        stream = self.server.store.get_stream(stream_id)
+        if stream is None or stream.error:
+            self.send_error(404)
+            return
+        if stream.done and stream.name:
+            self.send_response(302)
+            self.send_header("Location", f"/media/{stream.name}")
+            self.end_headers()
+            return
+
+        # No Content-Length: the body ends when the connection closes
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES.get(ext, "application/octet-stream"))
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        if head:
+            return
+        try:
+            for chunk in stream.iter_chunks():
+                self.wfile.write(chunk)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bind_host(base_url: Optional[str] = MEDIA_BASE_URL) -> str:
+    if MEDIA_BIND_HOST:
+        return MEDIA_BIND_HOST
+    parsed = urlparse(base_url or "")
+    if parsed.hostname and parsed.port == MEDIA_PORT:
+        return parsed.hostname
+    return "127.0.0.1"
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_media_store() -> MediaStore:
+    """Return the process-wide media store, starting its HTTP server on first use if MEDIA_BASE_URL is set"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MediaStore()
+            if not MEDIA_BASE_URL:
+                return _store
+            try:
+                server = ThreadingHTTPServer((bind_host(), MEDIA_PORT), _MediaHandler)
+            except OSError:
+                # Port taken (e.g. another worker on this host); callers fall back to inline audio
+                return _store
+            server.daemon_threads = True
+            server.store = _store
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            _store.base_url = MEDIA_BASE_URL.rstrip("/")
+        return _store
+
+
+def synthesis_key(text: str, voice_id: str, settings: str = "") -> str:
+    """Cache key for a TTS request; identical text and voice reuse stored audio"""
+    return hashlib.sha256(f"{voice_id}|{settings}|{text}".encode("utf-8")).hexdigest()
@@ -0,0 +1,306 @@
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core import lazy_import
+
+np = lazy_import("numpy")
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; an index directory is then only safe for one process
+    fcntl = None
+
+# Long-term memory: past messages embedded locally and recalled into the prompt
+MEMORY_DIR = Path(os.getenv("MEMORY_DIR", ".memory_index"))
+MEMORY_DIM = int(os.getenv("MEMORY_DIM", "1024"))
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "4"))
+# Budget for recalled text in the prompt (~4 characters per token)
+MEMORY_MAX_CHARS = int(os.getenv("MEMORY_MAX_CHARS", "1200"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.15"))
+# Messages shorter than this ("ok", "haha") carry nothing worth recalling
+MIN_MESSAGE_CHARS = 20
+SNIPPET_CHARS = 300
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+# Crude stemming so "wedding"/"weddings" and "sister's"/"sister" share features
+_SUFFIX_RE = re.compile(r"(?:'s|'|ing|ed|es|s)$")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do for from had has have he her him his i if in is it its "
+    "me my of on or our she so that the their them they this to was we were what when with "
+    "you your i'm it's im just".split()
+)
+
+
+class HashingEmbedder:
+    """Bag of words and word pairs hashed into a fixed-size, L2-normalised vector
+
+    No model download and no vocabulary to keep in sync; similar wording maps
+    to similar vectors, which is enough for recalling what was talked about.
+    """
+
+    def __init__(self, dim: int = MEMORY_DIM):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = [_SUFFIX_RE.sub("", w) if len(w) > 4 else w.rstrip("'")
+                 for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, text: str) -> "np.ndarray":
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # Sign bit from the hash keeps collisions from only ever adding up
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """Append-only vector index in a memory-mapped float32 file plus a JSONL sidecar
+
+    Inserts write one row into the mapped file (grown by doubling) and one
+    metadata line, so nothing is rebuilt. Forgetting a conversation appends a
+    tombstone line and masks its rows. Each row's conversation and persona are
+    also kept as integer codes in arrays beside the vectors, so search filters
+    with vector comparisons instead of walking the metadata.
+
+    Worker processes on one host can share the directory: writes hold an
+    flock, and every operation first reads the metadata lines other processes
+    appended, so row numbers stay in step with the shared vector file.
+    """
+
+    def __init__(self, root: Path = MEMORY_DIR, embedder: Optional[HashingEmbedder] = None):
+        self.root = root
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.root / f"vectors_{self.dim}.f32"
+        self._meta_path = self.root / f"meta_{self.dim}.jsonl"
+        self._lock_path = self.root / f"index_{self.dim}.lock"
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._reset()
+        with self._locked(exclusive=False):
+            pass
+
+    def _reset(self):
+        self._meta: List[Dict] = []
+        self._forgotten = set()
+        # How far into the metadata file this process has read, and which file it was
+        self._meta_offset = 0
+        self._meta_inode = None
+        self._reset_rows()
+
+    def _reset_rows(self):
+        # Code 0 is "no persona recorded", which matches any persona filter
+        self._conversation_codes: Dict[str, int] = {}
+        self._persona_codes: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_conversation = np.zeros(0, dtype=np.int32)
+        self._row_persona = np.zeros(0, dtype=np.int32)
+
+    def _index_row(self, row: int, entry: Dict):
+        conversation = self._conversation_codes.setdefault(entry["conversation_id"], len(self._conversation_codes))
+        self._row_conversation[row] = conversation
+        persona = entry.get("persona")
+        self._row_persona[row] = self._persona_codes.setdefault(persona, len(self._persona_codes) + 1) if persona else 0
+        self._alive[row] = True
+
+    @contextmanager
+    def _locked(self, exclusive: bool = True):
+        """Hold this process's lock and the directory's flock, caught up with other processes"""
+        with self._lock, open(self._lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._catch_up()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """Apply metadata lines appended since this process last read the file"""
+        try:
+            stat = self._meta_path.stat()
+        except FileNotFoundError:
+            stat = None
+        inode = stat.st_ino if stat else None
+        if inode != self._meta_inode or (stat and stat.st_size < self._meta_offset):
+            # Cleared (possibly by another process): start over from the new files
+            self._reset()
+            self._meta_inode = inode
+            self._vectors = None
+        data = b""
+        if stat and stat.st_size > self._meta_offset:
+            with open(self._meta_path, "rb") as f:
+                f.seek(self._meta_offset)
+                data = f.read(stat.st_size - self._meta_offset)
+            # Only whole lines; a line being written is picked up next time
+            data = data[:data.rfind(b"\n") + 1]
+            self._meta_offset += len(data)
+        entries = [json.loads(line) for line in data.splitlines()]
+
+        rows = sum(1 for entry in entries if "forget" not in entry) + len(self._meta)
+        file_rows = self._vectors_path.stat().st_size // (4 * self.dim) if self._vectors_path.exists() else 0
+        capacity = max(1024, rows, file_rows)
+        if self._vectors is None or capacity > self._vectors.shape[0]:
+            self._map(capacity)
+        # A crash between the two writes can leave a row without metadata; the next add reuses it
+        for entry in entries:
+            self._apply(entry)
+
+    def _apply(self, entry: Dict):
+        if "forget" in entry:
+            self._forgotten.add(entry["forget"])
+            code = self._conversation_codes.get(entry["forget"])
+            if code is not None:
+                self._alive[self._row_conversation == code] = False
+            return
+        row = len(self._meta)
+        self._meta.append(entry)
+        self._index_row(row, entry)
+        self._alive[row] = entry["conversation_id"] not in self._forgotten
+
+    def _append(self, entry: Dict):
+        """Write a metadata line and apply it; the caller holds the exclusive lock"""
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with open(self._meta_path, "ab") as f:
+            f.write(line)
+        if self._meta_inode is None:
+            self._meta_inode = self._meta_path.stat().st_ino
+        self._meta_offset += len(line)
+        self._apply(entry)
+
+    def _map(self, capacity: int):
+        size = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dim))
+        # The per-row arrays grow with the vectors
+        for name in ("_alive", "_row_conversation", "_row_persona"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old[:capacity]
+            setattr(self, name, grown)
+
+    def __len__(self) -> int:
+        with self._locked(exclusive=False):
+            return int(self._alive.sum())
+
+    def add(self, conversation_id: str, role: str, content: str, persona: Optional[str] = None) -> bool:
+        """Index one message; returns False when it is too short to be worth keeping"""
+        if len(content.strip()) < MIN_MESSAGE_CHARS:
+            return False
+        vector = self.embedder.embed(content)
+        if not vector.any():
+            return False
+        entry = {"conversation_id": str(conversation_id), "role": role, "text": content[:SNIPPET_CHARS]}
+        if persona:
+            entry["persona"] = persona
+        with self._locked():
+            row = len(self._meta)
+            if row >= self._vectors.shape[0]:
+                self._vectors.flush()
+                self._map(self._vectors.shape[0] * 2)
+            self._vectors[row] = vector
+            self._append(entry)
+        return True
+
+    def search(self, query: str, k: int = MEMORY_TOP_K, exclude_conversation: Optional[str] = None,
+               min_score: float = MEMORY_MIN_SCORE, persona: Optional[str] = None) -> List[Dict]:
+        """Top-k past messages most similar to `query`, best first
+
+        With `persona`, only messages from conversations with that persona (or
+        indexed before personas were recorded) are considered.
+        """
+        vector = self.embedder.embed(query)
+        with self._locked(exclusive=False):
+            count = len(self._meta)
+            if not count or not vector.any():
+                return []
+            scores = self._vectors[:count] @ vector
+            mask = self._alive[:count].copy()
+            if exclude_conversation is not None:
+                code = self._conversation_codes.get(str(exclude_conversation))
+                if code is not None:
+                    mask &= self._row_conversation[:count] != code
+            if persona is not None:
+                personas = self._row_persona[:count]
+                mask &= (personas == 0) | (personas == self._persona_codes.get(persona, -1))
+            scores = np.where(mask, scores, -1.0)
+            top = np.argpartition(-scores, min(k, count) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [dict(self._meta[i], score=float(scores[i])) for i in top if scores[i] >= min_score]
+
+    def forget(self, conversation_id: str):
+        """Stop recalling messages from a deleted conversation"""
+        with self._locked():
+            self._append({"forget": str(conversation_id)})
+
+    def clear(self):
+        with self._locked():
+            self._vectors.flush()
+            self._vectors = None
+            self._vectors_path.unlink(missing_ok=True)
+            self._meta_path.unlink(missing_ok=True)
+            self._reset()
+            self._map(1024)
+
+
+def format_memories(hits: List[Dict], max_chars: int = MEMORY_MAX_CHARS) -> str:
+    """Recalled snippets as a prompt section, kept within the character budget"""
+    lines, used = [], 0
+    for hit in hits:
+        speaker = "Your partner said" if hit["role"] == "user" else "You said"
+        line = f'- {speaker}: "{hit["text"]}"'
+        if used + len(line) > max_chars:
+            break
+        lines.append(line)
+        used += len(line)
+    if not lines:
+        return ""
+    return "\n\nThings you remember from earlier conversations:\n" + "\n".join(lines)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_memory() -> VectorIndex:
+    """Return the process-wide memory index"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = VectorIndex()
+        return _index
+
+
+def rebuild(conversations) -> int:
+    """Index every message of stored conversations (e.g. a Mongo cursor); returns messages added"""
+    index = get_memory()
+    index.clear()
+    added = 0
+    for conversation in conversations:
+        for message in conversation.get("messages", []):
+            added += index.add(str(conversation["_id"]), message["role"], message["content"],
+                               conversation.get("persona"))
+    return added
+
+
+if __name__ == "__main__":
+    # Backfill the index from MongoDB: python memory.py
+    from pymongo import MongoClient
+    client = MongoClient(os.environ["MONGODB_URI"])
+    cursor = client.get_database("chat_history").conversations.find({}, {"messages": 1, "persona": 1})
+    print(f"Indexed {rebuild(cursor)} messages into {MEMORY_DIR}")
@@ -0,0 +1,274 @@
+"""Write-behind persistence for chat messages
+
+A message goes into the transcript and on screen straight away and is saved
+here in the background, so the user never waits on MongoDB and a slow or
+briefly unavailable database does not break a turn. Each message carries an
+ID chosen when it is written, and storage skips IDs it already has, so a
+retry after a timeout that did reach the server cannot store it twice.
+
+Messages of one conversation are saved in order; a failing write is retried
+with backoff and, once retries run out, waits (with everything after it) for
+the next message or an explicit retry. Pending messages live here rather than
+in session state, so a session evicted while idle loses none of them, and
+`with_pending` adds them to a history reloaded from storage. A discarded
+(deleted) conversation is remembered for a while, so a reply that finishes
+afterwards is dropped, and reported as not saved, instead of bringing the
+conversation back.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Background threads saving messages, shared by all sessions of this process
+WRITE_WORKERS = int(os.getenv("WRITE_WORKERS", "4"))
+# Attempts per message before it waits for the next message or a manual retry
+WRITE_ATTEMPTS = int(os.getenv("WRITE_ATTEMPTS", "5"))
+WRITE_BACKOFF = 0.5
+# How long messages for a discarded conversation keep being dropped (seconds)
+DISCARD_TTL = 3600
+
+
+def new_message_id() -> str:
+    return uuid.uuid4().hex
+
+
+class PendingMessage:
+    """A message waiting to be saved"""
+    __slots__ = ("id", "conversation_id", "role", "content", "persona", "timestamp", "attempts", "error", "save")
+
+    def __init__(self, conversation_id, role: str, content: str, persona: Optional[str],
+                 save: Callable[["PendingMessage"], None]):
+        self.id = new_message_id()
+        self.conversation_id = conversation_id
+        self.role = role
+        self.content = content
+        self.persona = persona
+        self.timestamp = datetime.now()
+        self.attempts = 0
+        self.error: Optional[str] = None
+        # Stores the message; must be safe to call again for the same message ID
+        self.save = save
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+
+class MessageWriter:
+    """Saves queued messages in the background, in order per conversation, retrying failures"""
+
+    def __init__(self, workers: int = WRITE_WORKERS, attempts: int = WRITE_ATTEMPTS, backoff: float = WRITE_BACKOFF):
+        self.attempts = attempts
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="write")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # conversation_id -> messages not yet saved, oldest first
+        self._queues: Dict[object, deque] = {}
+        # Conversations a worker is currently draining
+        self._draining = set()
+        # Discarded conversation -> when, oldest first; their later messages are dropped
+        self._discarded: "OrderedDict[object, float]" = OrderedDict()
+        # Discarded conversation -> messages dropped unsaved
+        self._dropped: Dict[object, int] = {}
+        self.saved = 0
+        self.retries = 0
+        # Duration of the write that stored each of the last 500 messages
+        self.latencies = deque(maxlen=500)
+        self.save_seconds = 0.0
+
+    def submit(self, message: PendingMessage):
+        """Queue a message; also restarts a conversation whose earlier writes gave up"""
+        with self._lock:
+            self._expire_discarded()
+            if message.conversation_id in self._discarded:
+                self._dropped[message.conversation_id] = self._dropped.get(message.conversation_id, 0) + 1
+                return
+            self._queues.setdefault(message.conversation_id, deque()).append(message)
+        self.retry(message.conversation_id)
+
+    def retry(self, conversation_id):
+        """Start saving a conversation's queued messages unless that is already under way"""
+        with self._lock:
+            if conversation_id in self._draining or not self._queues.get(conversation_id):
+                return
+            self._draining.add(conversation_id)
+            for message in self._queues[conversation_id]:
+                message.attempts = 0
+        self._executor.submit(self._drain, conversation_id)
+
+    def _drain(self, conversation_id):
+        while True:
+            with self._lock:
+                queue = self._queues.get(conversation_id)
+                if not queue:
+                    self._queues.pop(conversation_id, None)
+                    self._draining.discard(conversation_id)
+                    self._idle.notify_all()
+                    return
+                message = queue[0]
+            saved = self._save(message)
+            with self._lock:
+                if not saved and queue:
+                    # Left queued; the next message or retry() tries again
+                    self._draining.discard(conversation_id)
+                    self._idle.notify_all()
+                    return
+                # discard() may have emptied the queue while the message was saving
+                if queue and queue[0] is message:
+                    queue.popleft()
+
+    def _save(self, message: PendingMessage) -> bool:
+        while message.attempts < self.attempts:
+            if message.attempts:
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.backoff * 2 ** (message.attempts - 1))
+            with self._lock:
+                if message.conversation_id in self._discarded:
+                    return False
+            message.attempts += 1
+            start = time.perf_counter()
+            try:
+                message.save(message)
+            except Exception as e:
+                message.error = str(e)
+                continue
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.saved += 1
+                self.latencies.append(elapsed)
+                self.save_seconds += elapsed
+            message.error = None
+            return True
+        return False
+
+    def _expire_discarded(self):
+        cutoff = time.monotonic() - DISCARD_TTL
+        while self._discarded and next(iter(self._discarded.values())) < cutoff:
+            conversation_id, _ = self._discarded.popitem(last=False)
+            self._dropped.pop(conversation_id, None)
+
+    def discard(self, *conversation_ids, timeout: float = 10.0) -> bool:
+        """Drop the messages of conversations about to be deleted
+
+        Messages submitted for them later (such as the reply of a turn still
+        running) are dropped too. Waits for a save already under way, so it
+        cannot recreate a conversation after the caller deletes it; False if
+        that save did not finish within `timeout`.
+        """
+        deadline = time.monotonic() + timeout
+        discarded = set(conversation_ids)
+        with self._lock:
+            self._expire_discarded()
+            for conversation in discarded:
+                self._discarded[conversation] = time.monotonic()
+                self._discarded.move_to_end(conversation)
+                queue = self._queues.get(conversation)
+                if queue is not None:
+                    # The head of a conversation being drained is already on its way to storage
+                    unsent = len(queue) - (1 if queue and conversation in self._draining else 0)
+                    self._dropped[conversation] = self._dropped.get(conversation, 0) + unsent
+                    queue.clear()
+                    if conversation not in self._draining:
+                        del self._queues[conversation]
+            while discarded & self._draining:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+            return True
+
+    def pending(self, conversation_id) -> List[PendingMessage]:
+        with self._lock:
+            return list(self._queues.get(conversation_id, ()))
+
+    def with_pending(self, conversation_id, history: List[Dict]) -> List[Dict]:
+        """A conversation's stored messages plus the ones still waiting to be saved"""
+        stored = {message.get("id") for message in history}
+        return list(history) + [m.to_dict() for m in self.pending(conversation_id) if m.id not in stored]
+
+    def status(self, conversation_id) -> Dict:
+        """Save state of a conversation: "saved", "saving", "retrying", "failed" or "discarded"
+
+        Also the pending count and, for a discarded conversation, how many
+        of its messages were dropped without being saved.
+        """
+        with self._lock:
+            queue = list(self._queues.get(conversation_id, ()))
+            draining = conversation_id in self._draining
+            dropped = self._dropped.get(conversation_id, 0)
+        if dropped:
+            return {"state": "discarded", "pending": 0, "error": None, "dropped": dropped}
+        if not queue:
+            state = "saved"
+        elif not draining:
+            state = "failed"
+        elif queue[0].error is not None:
+            state = "retrying"
+        else:
+            state = "saving"
+        return {"state": state, "pending": len(queue), "error": queue[0].error if queue else None, "dropped": 0}
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until no conversation is being saved; True if nothing is left queued"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._draining:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            return not any(self._queues.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "saved": self.saved,
+                "retries": self.retries,
+                "pending": sum(len(queue) for queue in self._queues.values()),
+                "stalled_conversations": len([c for c, q in self._queues.items() if q and c not in self._draining]),
+                "dropped": sum(self._dropped.values()),
+                "p50_ms": _percentile_ms(latencies, 50),
+                "p95_ms": _percentile_ms(latencies, 95),
+            }
+
+    def prometheus_lines(self) -> List[str]:
+        """Stored-write latency as a summary over the recent writes, for /metrics"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+            lines = [
+                "# HELP chat_message_store_seconds Time of the write that stored a message in the background",
+                "# TYPE chat_message_store_seconds summary",
+            ]
+            for quantile in (50, 95):
+                lines.append(f'chat_message_store_seconds{{quantile="{quantile / 100}"}} '
+                             f"{_percentile_ms(latencies, quantile) / 1000:.6f}")
+            lines.append(f"chat_message_store_seconds_sum {self.save_seconds:.6f}")
+            lines.append(f"chat_message_store_seconds_count {self.saved}")
+            lines.append("# HELP chat_message_store_retries_total Background message writes retried")
+            lines.append("# TYPE chat_message_store_retries_total counter")
+            lines.append(f"chat_message_store_retries_total {self.retries}")
+            return lines
+
+
+def _percentile_ms(ordered: List[float], pct: float) -> float:
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 1) if ordered else 0.0
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> MessageWriter:
+    """Return the process-wide message writer"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = MessageWriter()
+        return _writer
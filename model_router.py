@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+# Models a turn can be routed to
+FAST_MODEL = os.getenv("FAST_MODEL", "claude-3-5-haiku-20241022")
+HEAVY_MODEL = os.getenv("HEAVY_MODEL", "claude-3-opus-20240229")
+# Optional JSON file overriding any of DEFAULT_RULES
+ROUTER_RULES = os.getenv("ROUTER_RULES")
+
+# USD per million tokens: (input, output)
+PRICES = {
+    "claude-3-opus-20240229": (15.0, 75.0),
+    "claude-3-5-sonnet-20240620": (3.0, 15.0),
+    "claude-3-5-haiku-20241022": (0.8, 4.0),
+    "claude-3-haiku-20240307": (0.25, 1.25),
+}
+
+# Shortest prefix the API will cache; a cache breakpoint on a shorter prompt is ignored
+MIN_CACHEABLE_TOKENS = {"haiku": 2048}
+DEFAULT_MIN_CACHEABLE_TOKENS = 1024
+
+DEFAULT_RULES = {
+    # Greetings, thanks and acknowledgements never need the heavy model
+    "trivial_pattern": r"^\W*(hi|hey|hello|yo|sup|thanks?|thank you|thx|ok(ay)?|cool|nice|great|lol|haha+|"
+                       r"good (morning|night|evening)|bye|see you|love you|miss you|yes|no|sure)\b(\W+\w+){0,3}\W*$",
+    # Requests that benefit from deeper reasoning
+    "heavy_pattern": r"\b(why|explain|analy[sz]e|plan|strategy|compare|advice|advise|should i|help me|"
+                     r"decide|decision|pros and cons|step[- ]by[- ]step|review|feedback|problem|struggling)\b",
+    # Messages longer than this go to the heavy model
+    "long_chars": 400,
+    # Messages up to this long count as short
+    "short_chars": 80,
+    # Past this many messages, anything but a short message goes to the heavy model
+    "deep_history": 40,
+    # Coach personalities (coach/*.txt) whose non-trivial turns always use the heavy model
+    "heavy_profiles": ["business_coach.txt", "career_coach.txt", "theologian.txt"],
+}
+
+
+class Route:
+    """Where a turn was sent and why"""
+    __slots__ = ("name", "model", "reason")
+
+    def __init__(self, name: str, model: str, reason: str):
+        self.name = name
+        self.model = model
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"Route({self.name}, {self.model}, {self.reason})"
+
+
+def is_cacheable(prefix: str, model: Optional[str]) -> bool:
+    """Whether `prefix` (estimated at ~4 characters per token) is long enough for `model` to cache"""
+    minimum = next((tokens for family, tokens in MIN_CACHEABLE_TOKENS.items() if family in (model or "")),
+                   DEFAULT_MIN_CACHEABLE_TOKENS)
+    return len(prefix) // 4 >= minimum
+
+
+def cost_usd(model: Optional[str], tokens: Dict[str, int]) -> float:
+    """Price of one call from its usage counts (cache writes at 1.25x, reads at 0.1x input)"""
+    if model not in PRICES:
+        return 0.0
+    input_price, output_price = PRICES[model]
+    return (tokens.get("input_tokens", 0) * input_price
+            + tokens.get("cache_creation_input_tokens", 0) * input_price * 1.25
+            + tokens.get("cache_read_input_tokens", 0) * input_price * 0.1
+            + tokens.get("output_tokens", 0) * output_price) / 1e6
+
+
+def load_rules(path: Optional[str] = ROUTER_RULES) -> Dict:
+    rules = dict(DEFAULT_RULES)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            rules.update(json.load(f))
+    return rules
+
+
+class ModelRouter:
+    """Picks the fast or heavy model per turn and keeps latency and cost per route"""
+
+    def __init__(self, rules: Optional[Dict] = None, fast_model: str = FAST_MODEL, heavy_model: str = HEAVY_MODEL):
+        self.rules = rules or load_rules()
+        self.fast_model = fast_model
+        self.heavy_model = heavy_model
+        self._trivial = re.compile(self.rules["trivial_pattern"], re.IGNORECASE)
+        self._heavy = re.compile(self.rules["heavy_pattern"], re.IGNORECASE)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def route(self, prompt: str, history_length: int = 0, profile: Optional[str] = None) -> Route:
+        """Route a user message given how many messages precede it and the persona file in use"""
+        text = prompt.strip()
+        rules = self.rules
+        if self._heavy.search(text):
+            return Route("heavy", self.heavy_model, "intent")
+        if self._trivial.match(text):
+            return Route("fast", self.fast_model, "smalltalk")
+        if len(text) > rules["long_chars"]:
+            return Route("heavy", self.heavy_model, "long")
+        short = len(text) <= rules["short_chars"]
+        if profile in rules["heavy_profiles"] and not short:
+            return Route("heavy", self.heavy_model, "profile")
+        if history_length >= rules["deep_history"] and not short:
+            return Route("heavy", self.heavy_model, "history")
+        return Route("fast", self.fast_model, "default")
+
+    def record(self, route: str, model: Optional[str], seconds: float, tokens: Dict[str, int]):
+        """Add one finished call to the route's latency and cost totals"""
+        with self._lock:
+            stats = self._stats.setdefault(route, {
+                "turns": 0, "cost_usd": 0.0, "latencies": deque(maxlen=500), "models": set()
+            })
+            stats["turns"] += 1
+            stats["cost_usd"] += cost_usd(model, tokens)
+            stats["latencies"].append(seconds)
+            if model:
+                stats["models"].add(model)
+
+    def summary(self) -> List[Dict]:
+        with self._lock:
+            rows = []
+            for route, stats in sorted(self._stats.items()):
+                latencies = sorted(stats["latencies"])
+                rows.append({
+                    "route": route,
+                    "models": ", ".join(sorted(stats["models"])),
+                    "turns": stats["turns"],
+                    "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+                    "cost_usd": round(stats["cost_usd"], 4),
+                    "cost_per_turn_usd": round(stats["cost_usd"] / stats["turns"], 5),
+                })
+            return rows
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Return the process-wide router"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
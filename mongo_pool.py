@@ -0,0 +1,208 @@
+"""MongoDB connection pool settings and monitoring for the process-wide client
+
+Pool size, idle timeout and wire compression come from the environment, and
+command/pool monitoring listeners record how long operations take and how long
+they waited for a connection, so pool exhaustion shows up as pool-wait latency
+in the debug panel and on /metrics instead of as unexplained slow turns.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+from core import lazy_import
+
+pymongo = lazy_import("pymongo")
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+# Connections kept open while idle, so a quiet process does not reconnect on the next turn
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+# Tried in order; ones whose library is missing (zstandard, python-snappy) are skipped
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+
+# Mongo operations take milliseconds, far below tracing.LATENCY_BUCKETS
+DB_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _percentile_ms(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 2) if ordered else 0.0
+
+
+class MongoPoolStats:
+    """Pool-wait and command-latency histograms plus connection counts, fed by the listeners"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> [bucket counts..., sum, count], like tracing's stage histograms
+        self._histograms: Dict[str, List[float]] = {}
+        self._recent: Dict[str, deque] = {}
+        self.counts = {"created": 0, "closed": 0, "checked_out": 0, "checkout_failed": 0,
+                       "pool_cleared": 0, "commands": 0, "command_failed": 0}
+        self.open = 0
+        self.in_use = 0
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            hist = self._histograms.setdefault(name, [0] * len(DB_LATENCY_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(DB_LATENCY_BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+            self._recent.setdefault(name, deque(maxlen=1000)).append(seconds)
+
+    def count(self, kind: str, open_delta: int = 0, in_use_delta: int = 0):
+        with self._lock:
+            self.counts[kind] += 1
+            self.open += open_delta
+            self.in_use = max(0, self.in_use + in_use_delta)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def health(self) -> Dict:
+        """Current pool state and recent latency percentiles"""
+        with self._lock:
+            waits = self._recent.get("pool_wait", ())
+            commands = [s for name, recent in self._recent.items() if name.startswith("command:") for s in recent]
+            return dict(
+                self.counts,
+                open=self.open,
+                in_use=self.in_use,
+                max_pool_size=MONGO_MAX_POOL_SIZE,
+                pool_wait_p50_ms=_percentile_ms(waits, 50),
+                pool_wait_p99_ms=_percentile_ms(waits, 99),
+                command_p50_ms=_percentile_ms(commands, 50),
+                command_p99_ms=_percentile_ms(commands, 99),
+            )
+
+    def prometheus_lines(self) -> List[str]:
+        with self._lock:
+            lines = [
+                "# HELP chat_mongo_pool_wait_seconds Time spent waiting to check a connection out of the pool",
+                "# TYPE chat_mongo_pool_wait_seconds histogram",
+            ]
+            wait = self._histograms.get("pool_wait")
+            if wait:
+                lines.extend(_histogram_lines("chat_mongo_pool_wait_seconds", "", wait))
+            lines.append("# HELP chat_mongo_command_seconds MongoDB command latency")
+            lines.append("# TYPE chat_mongo_command_seconds histogram")
+            for name, hist in sorted(self._histograms.items()):
+                if name.startswith("command:"):
+                    command = name.split(":", 1)[1]
+                    lines.extend(_histogram_lines("chat_mongo_command_seconds", f'command="{command}"', hist))
+            lines.append("# HELP chat_mongo_pool_events_total Connection pool and command events")
+            lines.append("# TYPE chat_mongo_pool_events_total counter")
+            for kind, count in sorted(self.counts.items()):
+                lines.append(f'chat_mongo_pool_events_total{{event="{kind}"}} {count}')
+            lines.append("# HELP chat_mongo_pool_connections Connections currently open and checked out")
+            lines.append("# TYPE chat_mongo_pool_connections gauge")
+            lines.append(f'chat_mongo_pool_connections{{state="open"}} {self.open}')
+            lines.append(f'chat_mongo_pool_connections{{state="in_use"}} {self.in_use}')
+            return lines
+
+
+def _histogram_lines(metric: str, labels: str, hist: List[float]) -> List[str]:
+    prefix = f"{labels}," if labels else ""
+    lines = [f'{metric}_bucket{{{prefix}le="{bound}"}} {hist[i]}' for i, bound in enumerate(DB_LATENCY_BUCKETS)]
+    lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {hist[-1]}')
+    lines.append(f"{metric}_sum{{{labels}}} {hist[-2]:.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {hist[-1]}")
+    return lines
+
+
+def make_listeners(stats: MongoPoolStats) -> List:
+    """Command and pool listeners that feed `stats`
+
+    pymongo only accepts subclasses of its listener types, so they are defined
+    here, when a client is built, rather than importing pymongo with this module.
+    """
+    class CommandLatency(pymongo.monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            stats.count("commands")
+            stats.observe(f"command:{event.command_name}", event.duration_micros / 1e6)
+
+        def failed(self, event):
+            stats.count("command_failed")
+            stats.observe(f"command:{event.command_name}", event.duration_micros / 1e6)
+
+    class PoolEvents(pymongo.monitoring.ConnectionPoolListener):
+        # Check-out events arrive on the thread that is waiting for the connection
+        _waiting = threading.local()
+
+        def pool_created(self, event):
+            pass
+
+        def pool_ready(self, event):
+            pass
+
+        def pool_cleared(self, event):
+            stats.count("pool_cleared")
+
+        def pool_closed(self, event):
+            pass
+
+        def connection_created(self, event):
+            stats.count("created", open_delta=1)
+
+        def connection_ready(self, event):
+            pass
+
+        def connection_closed(self, event):
+            stats.count("closed", open_delta=-1)
+
+        def connection_check_out_started(self, event):
+            self._waiting.since = time.perf_counter()
+
+        def connection_check_out_failed(self, event):
+            stats.count("checkout_failed")
+            self._observe_wait()
+
+        def connection_checked_out(self, event):
+            stats.count("checked_out", in_use_delta=1)
+            self._observe_wait()
+
+        def connection_checked_in(self, event):
+            stats.checked_in()
+
+        def _observe_wait(self):
+            since = getattr(self._waiting, "since", None)
+            if since is not None:
+                stats.observe("pool_wait", time.perf_counter() - since)
+                self._waiting.since = None
+
+    return [CommandLatency(), PoolEvents()]
+
+
+def client_options(allow_invalid_certificates: bool = False) -> Dict:
+    """Keyword arguments for the process's pymongo.MongoClient"""
+    return dict(
+        serverSelectionTimeoutMS=5000,
+        tls=True,
+        tlsAllowInvalidCertificates=allow_invalid_certificates,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+        compressors=MONGO_COMPRESSORS,
+        event_listeners=make_listeners(get_pool_stats()),
+    )
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_pool_stats() -> MongoPoolStats:
+    """Return the process-wide pool statistics"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = MongoPoolStats()
+        return _stats
@@ -0,0 +1,193 @@
+"""Persona registry: personality files in personas/, parsed and turned into prompts on first use"""
+import os
+from typing import Dict, List
+
+import streamlit as st
+
+# One personality file per selectable persona; each is parsed only once someone picks it
+PERSONA_DIR = os.getenv("PERSONA_DIR", "personas")
+DEFAULT_PERSONA = os.getenv("DEFAULT_PERSONA", "sophie.txt")
+# Used for any setting a persona's VOICE section leaves out
+DEFAULT_VOICE = {
+    "voice_id": "OYTbf65OHHFELVut7v2H",
+    "stability": 0.71,
+    "similarity_boost": 0.5,
+    "style": 0.0,
+    "use_speaker_boost": True,
+}
+
+
+# Headers that belong to the section above them in a personality file
+SUBSECTIONS = {
+    "love languages": {"giving", "receiving"},
+    "responses to user love": {"touch", "acts of service"},
+    "conversation style": {"greetings", "responses", "happy", "sad", "neutral"},
+}
+
+
+def load_personality_from_file(file_path: str) -> Dict:
+    """Load and parse personality from a text file"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+
+        lines = content.strip().split('\n')
+        personality = {
+            "basic_info": {},
+            "traits": [],
+            "love_languages": {
+                "giving": [],
+                "receiving": []
+            },
+            "user_love_languages": [],
+            "love_responses": {
+                "touch": [],
+                "acts_of_service": []
+            },
+            "conversation_style": {
+                "greetings": [],
+                "responses": {
+                    "happy": [],
+                    "sad": [],
+                    "neutral": []
+                }
+            },
+            "voice": dict(DEFAULT_VOICE)
+        }
+
+        current_section = None
+        current_subsection = None
+        love_language_type = None
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            # Headers such as GIVING: or HAPPY: open a subsection of the current
+            # section; any other header starts a new section
+            if line.endswith(':') and line[:-1].lower() not in SUBSECTIONS.get(current_section, ()):
+                current_section = line[:-1].lower()
+                current_subsection = None
+                love_language_type = None
+                continue
+
+            if ':' in line and current_section is None:
+                key, value = line.split(':', 1)
+                personality["basic_info"][key.lower().strip()] = value.strip()
+
+            elif current_section == "love languages":
+                if line.lstrip('- ').startswith('GIVING'):
+                    love_language_type = "giving"
+                elif line.lstrip('- ').startswith('RECEIVING'):
+                    love_language_type = "receiving"
+                elif line.startswith('-') and love_language_type:
+                    personality["love_languages"][love_language_type].append(line[1:].strip())
+
+            elif current_section == "user love languages" and line.startswith('-'):
+                personality["user_love_languages"].append(line[1:].strip())
+
+            elif current_section == "responses to user love":
+                if line.startswith('TOUCH:'):
+                    current_subsection = "touch"
+                elif line.startswith('ACTS OF SERVICE:'):
+                    current_subsection = "acts_of_service"
+                elif line.startswith('-') and current_subsection:
+                    personality["love_responses"][current_subsection].append(line[1:].strip())
+
+            elif current_section == "traits" and line.startswith('-'):
+                personality["traits"].append(line[1:].strip())
+
+            elif current_section == "voice" and line.startswith('-') and ':' in line:
+                key, value = line[1:].split(':', 1)
+                key, value = key.strip().lower(), value.strip()
+                if key == "voice_id":
+                    personality["voice"][key] = value
+                elif key == "use_speaker_boost":
+                    personality["voice"][key] = value.lower() in ("true", "yes", "1")
+                else:
+                    personality["voice"][key] = float(value)
+
+            elif current_section == "conversation style":
+                if line.startswith('GREETINGS'):
+                    current_subsection = "greetings"
+                elif line.startswith('RESPONSES'):
+                    current_subsection = "responses"
+                elif line.startswith('-') and current_subsection == "greetings":
+                    personality["conversation_style"]["greetings"].append(line[1:].strip())
+                elif line.startswith('HAPPY:'):
+                    current_subsection = "happy"
+                elif line.startswith('SAD:'):
+                    current_subsection = "sad"
+                elif line.startswith('NEUTRAL:'):
+                    current_subsection = "neutral"
+                elif line.startswith('-'):
+                    if current_subsection in ["happy", "sad", "neutral"]:
+                        personality["conversation_style"]["responses"][current_subsection].append(line[1:].strip())
+
+        return personality
+    except FileNotFoundError:
+        st.error(f"Could not find {file_path}. Please make sure the file exists in the correct location.")
+        return None
+    except Exception as e:
+        st.error(f"Error loading personality file: {str(e)}")
+        return None
+
+
+def create_system_prompt(personality: Dict) -> str:
+    """Create a system prompt based on personality profile"""
+    name = personality["basic_info"].get("name", "AI")
+    prompt = f"""You are {name}. Your personality is warm, genuine, and authentically human. Express yourself naturally as {name}, never referring to yourself as AI or artificial - simply be yourself. Your traits include:
+{' '.join(personality['traits'])}
+
+About you:
+"""
+
+    for key, value in personality["basic_info"].items():
+        if key != "name":
+            prompt += f"- {key}: {value}\n"
+
+    # Add love languages
+    prompt += "\nWays you show love:"
+    for giving in personality["love_languages"]["giving"]:
+        prompt += f"\n- {giving}"
+
+    prompt += "\n\nWhat makes you feel loved:"
+    for receiving in personality["love_languages"]["receiving"]:
+        prompt += f"\n- {receiving}"
+
+    # Add user's love languages
+    prompt += "\n\nYour partner's love languages:"
+    for user_love in personality["user_love_languages"]:
+        prompt += f"\n- {user_love}"
+
+    prompt += "\n\nBe yourself and interact naturally. Show genuine emotion and warmth in your responses."
+    prompt += "\nRespond to expressions of affection based on both your and your partner's love languages."
+    prompt += "\nUse emojis occasionally to express emotion, but keep it natural and not excessive."
+
+    return prompt
+
+
+def list_personas() -> List[str]:
+    """Persona files available to pick from (a directory listing; nothing is parsed)"""
+    try:
+        return sorted(f for f in os.listdir(PERSONA_DIR) if f.endswith(".txt"))
+    except Exception as e:
+        st.error(f"Error listing personas: {str(e)}")
+        return []
+
+
+def persona_label(persona: str) -> str:
+    return os.path.splitext(persona)[0].replace("_", " ").title()
+
+
+@st.cache_resource
+def get_personality(persona: str = DEFAULT_PERSONA):
+    """Parsed personality shared across sessions (treat as read-only)"""
+    return load_personality_from_file(os.path.join(PERSONA_DIR, persona))
+
+
+@st.cache_resource
+def get_system_prompt(persona: str) -> str:
+    """A persona's system prompt, built once per process"""
+    return create_system_prompt(get_personality(persona))
@@ -0,0 +1,337 @@
+"""Replay stored conversations through the current prompt builder and turn pipeline.
+
+Samples conversations from chat_history.conversations with CloudChatStorage and
+re-asks their user messages through aigf_app, headlessly with AppTest against
+the fake LLM (answering with the recorded replies), with the transcript up to
+that point in the session. Every replayed turn records prompt size, token
+counts, estimated cost and per-stage latency from its trace. The run summary is
+appended to a history file, so changes to create_system_prompt or the context
+handling show up as a trend, and --gate fails the run when it is worse than
+the last passing run of the same sample.
+
+    python replay.py --sample 50 --dump sample.jsonl          # from MONGODB_URI, keep the sample
+    python replay.py --transcripts sample.jsonl --gate        # offline, exit 1 on regression
+    python replay.py --synthetic 40 --gate                    # no stored data needed
+    python replay.py --trend 20
+
+Dumped samples hold real conversations; keep them out of the repository.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+# Replayed turns must not touch the real memory index, and warm-up priming in
+# the background would make cache token counts differ from run to run
+if "MEMORY_DIR" not in os.environ:
+    os.environ["MEMORY_DIR"] = tempfile.mkdtemp(prefix="replay_memory_")
+    atexit.register(shutil.rmtree, os.environ["MEMORY_DIR"], True)
+os.environ.setdefault("WARMUP", "0")
+
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from unittest import mock
+
+import streamlit as st
+from bson import ObjectId
+from streamlit.testing.v1 import AppTest
+
+import fakes
+from aigf_app import CONFIGS
+from benchmark import APP_DIR, APPS, percentile, send_turn
+from message_writer import get_writer
+from persona import list_personas
+from transcript import Transcript
+
+REPLAY_HISTORY = os.getenv("REPLAY_HISTORY", "replay_history.jsonl")
+
+# Summary fields the gate compares: deterministic ones get a tight tolerance,
+# timings a loose one, since they move with machine load
+SIZE_METRICS = ("prompt_tokens_mean", "prompt_tokens_p95", "system_chars_mean", "cost_per_turn_usd")
+LATENCY_METRICS = ("turn_ms_p50", "prompt_build_ms_mean", "memory_ms_mean")
+
+
+def load_stored(size: int) -> List[Dict]:
+    """A random sample of stored conversations, read with the app's own storage"""
+    from chat_storage import get_storage
+    conversations = get_storage().sample_conversations(size)
+    # The storage client is a cached resource; drop it so replayed turns get the fake one
+    st.cache_resource.clear()
+    return [
+        {"id": str(c["_id"]), "persona": c.get("persona"),
+         "messages": [{"role": m["role"], "content": m["content"]} for m in c.get("messages", [])]}
+        for c in conversations
+    ]
+
+
+def load_transcripts(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_conversations(count: int, seed: int = 0) -> List[Dict]:
+    """Deterministic conversations with a long-tailed length distribution, like real ones"""
+    rng = random.Random(seed)
+    words = fakes.REPLY_WORDS
+    conversations = []
+    for i in range(count):
+        length = min(200, max(2, int(rng.lognormvariate(3.0, 0.9))))
+        messages = [
+            {"role": "user" if j % 2 == 0 else "assistant",
+             "content": " ".join(rng.choice(words) for _ in range(rng.randint(3, 25 if j % 2 == 0 else 60)))}
+            for j in range(length)
+        ]
+        conversations.append({"id": f"synthetic-{seed}-{i}", "persona": None, "messages": messages})
+    return conversations
+
+
+def replay_points(messages: List[Dict], per_conversation: int) -> List[int]:
+    """Indexes of up to `per_conversation` user messages, spread evenly and including the last"""
+    users = [i for i, m in enumerate(messages) if m["role"] == "user"]
+    if len(users) <= per_conversation:
+        return users
+    step = (len(users) - 1) / (per_conversation - 1) if per_conversation > 1 else 0
+    return sorted({users[round(len(users) - 1 - k * step)] for k in range(per_conversation)})
+
+
+def sample_id(conversations: List[Dict], per_conversation: int) -> str:
+    """Fingerprint of what is replayed; only runs of the same sample are compared"""
+    digest = hashlib.sha1(str(per_conversation).encode())
+    for conversation in conversations:
+        digest.update(json.dumps([conversation.get("persona"), conversation["messages"]]).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def replay_conversation(app: str, conversation: Dict, per_conversation: int, recorded: Dict) -> List[Dict]:
+    """Replay one conversation's turns in a single session; one result per turn"""
+    messages = conversation["messages"]
+    at = AppTest.from_file(str(APP_DIR / APPS[app]["script"]), default_timeout=120)
+    if conversation.get("persona") in list_personas():
+        at.session_state["persona"] = conversation["persona"]
+    at.session_state["conversation_id"] = ObjectId()
+    at.run()
+
+    results = []
+    for index in replay_points(messages, per_conversation):
+        at.session_state["messages"] = Transcript(messages[:index])
+        following = messages[index + 1] if index + 1 < len(messages) else None
+        recorded["reply"] = following["content"] if following and following["role"] == "assistant" else None
+        result = {"conversation": conversation["id"], "context_messages": index}
+        try:
+            result["turn_ms"] = send_turn(at, app, messages[index]["content"]) * 1000
+        except Exception as e:
+            result["error"] = str(e)
+            results.append(result)
+            continue
+        # Background writes feed memory recall for later turns; finish them so runs are repeatable
+        get_writer().flush()
+        trace = at.session_state["traces"][-1]
+        tokens = trace["tokens"]
+        result.update(
+            route=trace["route"],
+            model=trace["model"],
+            system_chars=trace["counts"].get("system_chars", 0),
+            history_chars=trace["counts"].get("history_chars", 0),
+            prompt_tokens=(tokens.get("input_tokens", 0) + tokens.get("cache_read_input_tokens", 0)
+                           + tokens.get("cache_creation_input_tokens", 0)),
+            cached_tokens=tokens.get("cache_read_input_tokens", 0),
+            output_tokens=tokens.get("output_tokens", 0),
+            cost_usd=trace["cost_usd"],
+            spans_ms=trace["spans_ms"],
+        )
+        results.append(result)
+    return results
+
+
+def replay(app: str, conversations: List[Dict], per_conversation: int) -> List[Dict]:
+    recorded = {"reply": None}
+
+    def recorded_reply(messages: List[Dict], words: int = 40) -> str:
+        return recorded["reply"] or original_reply(messages, words)
+
+    original_reply = fakes.fake_reply
+    os.chdir(APP_DIR)  # apps read personas/ relative to the cwd
+    results = []
+    with fakes.offline_services(), mock.patch.object(fakes, "fake_reply", recorded_reply):
+        for conversation in conversations:
+            results.extend(replay_conversation(app, conversation, per_conversation, recorded))
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(app: str, source: str, sample: str, conversations: List[Dict], results: List[Dict]) -> Dict:
+    turns = [r for r in results if "error" not in r]
+    llm_turns = [r for r in turns if r["route"] != "canned"]
+
+    def mean(values) -> float:
+        values = list(values)
+        return round(statistics.mean(values), 2) if values else 0.0
+
+    prompt_tokens = [r["prompt_tokens"] for r in llm_turns]
+    context = [r["context_messages"] for r in results]
+    stages = sorted({stage for r in turns for stage in r["spans_ms"]})
+    # queue_message only times handing a message to the writer; this is the write itself
+    writes = get_writer().stats()
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "app": app,
+        "source": source,
+        "sample": sample,
+        "conversations": len(conversations),
+        "turns": len(results),
+        "errors": len(results) - len(turns),
+        "llm_turns": len(llm_turns),
+        "context_messages_p50": percentile(context, 50),
+        "context_messages_max": max(context, default=0),
+        "system_chars_mean": mean(r["system_chars"] for r in llm_turns),
+        "history_chars_mean": mean(r["history_chars"] for r in llm_turns),
+        "prompt_tokens_mean": mean(prompt_tokens),
+        "prompt_tokens_p95": percentile(prompt_tokens, 95),
+        "cached_share": round(sum(r["cached_tokens"] for r in llm_turns) / sum(prompt_tokens), 3) if prompt_tokens else 0.0,
+        "output_tokens_mean": mean(r["output_tokens"] for r in llm_turns),
+        "cost_per_turn_usd": round(sum(r["cost_usd"] for r in turns) / len(turns), 6) if turns else 0.0,
+        "turn_ms_p50": round(percentile([r["turn_ms"] for r in turns], 50), 2),
+        "turn_ms_p95": round(percentile([r["turn_ms"] for r in turns], 95), 2),
+        **{f"{stage}_ms_mean": mean(r["spans_ms"].get(stage, 0.0) for r in turns) for stage in stages},
+        "store_write_ms_p50": writes["p50_ms"],
+        "store_write_ms_p95": writes["p95_ms"],
+        "routes": {route: sum(1 for r in turns if r["route"] == route) for route in sorted({r["route"] for r in turns})},
+    }
+
+
+def load_history(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline_for(history: List[Dict], summary: Dict) -> Optional[Dict]:
+    """The last run of the same sample and app that did not fail the gate"""
+    for run in reversed(history):
+        if run["sample"] == summary["sample"] and run["app"] == summary["app"] and run.get("gate") != "failed":
+            return run
+    return None
+
+
+def check_gate(summary: Dict, baseline: Dict, max_increase: float, max_latency_increase: float,
+               min_latency_delta_ms: float) -> List[str]:
+    """Regressions of `summary` against `baseline`, as readable lines"""
+    failures = []
+    if summary["errors"] > baseline["errors"]:
+        failures.append(f"errors: {baseline['errors']} -> {summary['errors']}")
+    limits = [(metric, max_increase, 0.0) for metric in SIZE_METRICS]
+    limits += [(metric, max_latency_increase, min_latency_delta_ms) for metric in LATENCY_METRICS]
+    for metric, tolerance, floor in limits:
+        before, after = baseline.get(metric), summary.get(metric)
+        if not before or after is None:
+            continue
+        if after > before * (1 + tolerance) and after - before > floor:
+            failures.append(f"{metric}: {before} -> {after} (+{(after / before - 1) * 100:.1f}%, "
+                            f"limit +{tolerance * 100:.0f}%)")
+    return failures
+
+
+def print_trend(runs: List[Dict]):
+    columns = ["timestamp", "commit", "app", "sample", "turns", "errors", "prompt_tokens_mean", "prompt_tokens_p95",
+               "cached_share", "cost_per_turn_usd", "turn_ms_p50", "prompt_build_ms_mean", "gate"]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in runs)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for run in runs:
+        print("  ".join(str(run.get(c, "")).rjust(widths[c]) for c in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stored conversations and track prompt size, cost and latency")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--sample", type=int, help="replay this many conversations sampled from MongoDB")
+    source.add_argument("--transcripts", help="replay conversations from a JSON lines file (see --dump)")
+    source.add_argument("--synthetic", type=int, help="replay this many generated conversations")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --synthetic")
+    parser.add_argument("--dump", help="write the conversations replayed to this JSON lines file")
+    parser.add_argument("--app", default="aigf_prod", choices=list(CONFIGS))
+    parser.add_argument("--turns-per-conversation", type=int, default=3,
+                        help="user messages replayed per conversation, spread over its length")
+    parser.add_argument("--history", default=REPLAY_HISTORY, help="run summaries are appended here")
+    parser.add_argument("--no-record", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--gate", action="store_true",
+                        help="exit 1 if this run regressed against the last passing run of the same sample")
+    parser.add_argument("--max-increase", type=float, default=0.05,
+                        help="allowed relative increase in prompt size and cost")
+    parser.add_argument("--max-latency-increase", type=float, default=0.25,
+                        help="allowed relative increase in latencies")
+    parser.add_argument("--min-latency-delta-ms", type=float, default=5.0,
+                        help="latency increases smaller than this never fail the gate")
+    parser.add_argument("--trend", type=int, nargs="?", const=10,
+                        help="only print the last N runs from the history")
+    parser.add_argument("--json", help="also write the per-turn results to this file")
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    if args.trend is not None and not (args.sample or args.transcripts or args.synthetic):
+        print_trend(history[-args.trend:])
+        return 0
+
+    if args.sample:
+        conversations, source_name = load_stored(args.sample), "mongodb"
+    elif args.transcripts:
+        conversations, source_name = load_transcripts(args.transcripts), args.transcripts
+    else:
+        conversations, source_name = synthetic_conversations(args.synthetic or 20, args.seed), f"synthetic:{args.seed}"
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as f:
+            for conversation in conversations:
+                f.write(json.dumps(conversation) + "\n")
+
+    start = time.perf_counter()
+    results = replay(args.app, conversations, args.turns_per_conversation)
+    sample = sample_id(conversations, args.turns_per_conversation)
+    summary = summarize(args.app, source_name, sample, conversations, results)
+    print(f"replayed {summary['turns']} turns from {len(conversations)} conversations "
+          f"in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    status = 0
+    if args.gate:
+        baseline = baseline_for(history, summary)
+        if baseline is None:
+            print(f"gate: no earlier run of sample {sample}; this run becomes the baseline")
+            summary["gate"] = "baseline"
+        else:
+            failures = check_gate(summary, baseline, args.max_increase, args.max_latency_increase,
+                                  args.min_latency_delta_ms)
+            summary["gate"] = "failed" if failures else "passed"
+            print(f"gate {summary['gate']} against {baseline['commit']} ({baseline['timestamp']})")
+            for failure in failures:
+                print(f"  {failure}")
+            status = 1 if failures else 0
+
+    if not args.no_record:
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+    print_trend([run for run in history if run["sample"] == sample][-9:] + [summary])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "turns": results}, f, indent=2, default=str)
+    return status
+
+
+if __name__ == "__main__":
+    # AppTest swaps out sys.modules["__main__"], so run via the importable module
+    from replay import main
+    sys.exit(main())
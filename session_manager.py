@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from transcript import Transcript
+
+# Sessions with no rerun for this long give up their transcript and lists
+IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
+# Where transcripts go for apps without a storage backend
+SPILL_DIR = Path(os.getenv("SESSION_SPILL_DIR", ".session_spill"))
+
+# Session state keys released on eviction; apps rebuild them on the next rerun
+EVICTABLE_KEYS = ("messages", "conversation_list", "traces")
+
+
+class _TrackedSession:
+    __slots__ = ("state", "app", "spill", "last_seen", "evicted")
+
+    def __init__(self, state, app: str, spill: bool):
+        self.state = state
+        self.app = app
+        self.spill = spill
+        self.last_seen = time.monotonic()
+        self.evicted = False
+
+
+class SessionManager:
+    """Notices idle sessions and releases their memory
+
+    Apps with storage (aigf_prod) rehydrate lazily from `conversation_id`;
+    apps without it (coach) have their transcript spilled to a local file
+    and restored on the next rerun.
+    """
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT, spill_dir: Path = SPILL_DIR):
+        self.idle_timeout = idle_timeout
+        self.spill_dir = spill_dir
+        self._sessions: Dict[str, _TrackedSession] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.rehydrations = 0
+        self._remove_stale_spills()
+
+    def _remove_stale_spills(self):
+        """Delete transcripts spilled by sessions of an earlier run that never came back"""
+        if not self.spill_dir.is_dir():
+            return
+        cutoff = time.time() - self.idle_timeout
+        for path in self.spill_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                # Already restored or removed by another worker
+                pass
+
+    def touch(self, session_id: str, state, app: str, spill: bool = False):
+        """Record activity for a session, restoring a spilled transcript if needed"""
+        with self._lock:
+            tracked = self._sessions.get(session_id)
+            if tracked is None or tracked.state is not state:
+                tracked = _TrackedSession(state, app, spill)
+                self._sessions[session_id] = tracked
+            tracked.last_seen = time.monotonic()
+            if tracked.evicted:
+                self.rehydrations += 1
+            tracked.evicted = False
+
+        spill_path = self._spill_path(session_id)
+        if spill and "messages" not in state and spill_path.exists():
+            with open(spill_path, "r", encoding="utf-8") as f:
+                state["messages"] = Transcript(json.load(f))
+            spill_path.unlink()
+
+    def sweep(self) -> int:
+        """Evict every session idle longer than the timeout; returns how many were evicted"""
+        now = time.monotonic()
+        with self._lock:
+            # Forget sessions Streamlit has already closed; they never come back to restore a spill
+            closed = [sid for sid in self._sessions if not _is_open(sid)]
+            for session_id in closed:
+                del self._sessions[session_id]
+            idle = [(sid, t) for sid, t in self._sessions.items()
+                    if not t.evicted and now - t.last_seen > self.idle_timeout]
+            for _, tracked in idle:
+                tracked.evicted = True
+
+        for session_id in closed:
+            self._spill_path(session_id).unlink(missing_ok=True)
+        evicted = 0
+        for session_id, tracked in idle:
+            try:
+                self._evict(session_id, tracked.state, tracked.spill)
+                evicted += 1
+            except Exception:
+                # Leave the session as it was; it will be retried on the next sweep
+                tracked.evicted = False
+        self.evictions += evicted
+        return evicted
+
+    def _evict(self, session_id: str, state, spill: bool):
+        if spill and "messages" in state and state["messages"]:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            spill_path = self._spill_path(session_id)
+            with open(spill_path, "w", encoding="utf-8") as f:
+                json.dump(state["messages"].to_api(), f)
+        for key in EVICTABLE_KEYS:
+            if key in state:
+                del state[key]
+        _release_media(session_id)
+
+    def _spill_path(self, session_id: str) -> Path:
+        return self.spill_dir / f"{session_id}.json"
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            evicted = sum(1 for t in self._sessions.values() if t.evicted)
+            return {
+                "tracked": len(self._sessions),
+                "active": len(self._sessions) - evicted,
+                "evicted": evicted,
+                "evictions": self.evictions,
+                "rehydrations": self.rehydrations,
+            }
+
+
+def _is_open(session_id: str) -> bool:
+    """Whether the Streamlit runtime still has a connected session with this id"""
+    from streamlit import runtime
+    if not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(session_id)
+
+
+def _release_media(session_id: str):
+    """Drop Streamlit's references to audio/media files created by the session"""
+    try:
+        from streamlit import runtime
+        if runtime.exists():
+            media_file_mgr = runtime.get_instance().media_file_mgr
+            media_file_mgr.clear_session_refs(session_id)
+            media_file_mgr.remove_orphaned_files()
+    except Exception:
+        pass
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def _sweep_forever(manager: SessionManager):
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        manager.sweep()
+
+
+def get_session_manager() -> SessionManager:
+    """Return the process-wide session manager, starting its sweeper thread"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = SessionManager()
+            threading.Thread(target=_sweep_forever, args=(_manager,), daemon=True).start()
+        return _manager
+
+
+def track_session(app: str, spill: bool = False):
+    """Call at the top of every rerun so idle sessions can be evicted and rehydrated"""
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    # ctx.session_state is a per-run wrapper; track the SessionState it wraps,
+    # which lives as long as the browser session
+    state = getattr(ctx.session_state, "_state", ctx.session_state)
+    get_session_manager().touch(ctx.session_id, state, app, spill)
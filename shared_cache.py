@@ -0,0 +1,219 @@
+"""Cache shared by every Streamlit replica, for data that must look the same on all of them
+
+st.cache_data is per process, so with several replicas behind a load balancer
+each one warms its own copy and an invalidation on one never reaches the
+others. Values here live in a shared backend chosen by SHARED_CACHE_URL:
+
+    (unset)                 in this process only (a single replica)
+    file:///var/cache/chat  a directory shared by workers on the same host
+    redis://host:6379/0     a Redis-compatible server shared by all replicas
+
+Invalidation is a message every replica sees: each namespace has a generation
+counter in the backend, stored values carry the generation they were loaded
+under, and invalidating bumps the counter. The counter and the value are read
+in one round trip, so a replica never serves an entry from before the last
+invalidation, and the first load after it refills the entry for everyone.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from core import lazy_import
+
+redis = lazy_import("redis")
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; FileBackend counters are then only safe within one process
+    fcntl = None
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "")
+SHARED_CACHE_TTL = int(os.getenv("SHARED_CACHE_TTL", "600"))
+KEY_PREFIX = "chatcache:"
+
+
+class MemoryBackend:
+    """Backend for a single process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, tuple] = {}
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.time()
+        with self._lock:
+            return [value if value is not None and expires > now else None
+                    for expires, value in (self._values.get(key, (0, None)) for key in keys)]
+
+    def set(self, key: str, value: bytes, ttl: Optional[int]):
+        with self._lock:
+            self._values[key] = (time.time() + ttl if ttl else float("inf"), value)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            _, value = self._values.get(key, (0, b"0"))
+            value = str(int(value) + 1).encode()
+            self._values[key] = (float("inf"), value)
+            return int(value)
+
+
+class FileBackend:
+    """Backend in a directory, shared by worker processes on one host
+
+    Each key is a file written atomically (temp file + rename); counters are
+    incremented under an flock (a thread lock where flock is unavailable) so
+    concurrent invalidations are not lost.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _counters_locked(self):
+        with self._lock, open(self.root / "counters.lock", "a") as lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _path(self, key: str) -> Path:
+        return self.root / hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if expires is None or expires > time.time() else None
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._read(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl: Optional[int]):
+        fd, tmp = tempfile.mkstemp(dir=self.root)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((time.time() + ttl if ttl else None, value), f)
+        os.replace(tmp, self._path(key))
+
+    def incr(self, key: str) -> int:
+        with self._counters_locked():
+            value = int(self._read(key) or b"0") + 1
+            self.set(key, str(value).encode(), None)
+            return value
+
+
+class RedisBackend:
+    """Backend on a Redis-compatible server shared by all replicas (needs the redis package)"""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self.client.mget(keys)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int]):
+        self.client.set(key, value, ex=ttl or None)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+
+def make_backend(url: str = SHARED_CACHE_URL):
+    parsed = urlparse(url)
+    if not url:
+        return MemoryBackend()
+    if parsed.scheme == "file":
+        return FileBackend(parsed.path)
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL: {url}")
+
+
+class SharedCache:
+    """Namespaced get-or-load cache over a shared backend, with cross-replica invalidation
+
+    A backend error never fails the caller: the value is loaded directly and
+    counted as an error, so an unreachable Redis degrades to no caching.
+    """
+
+    def __init__(self, backend, ttl: int = SHARED_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0}
+        )
+
+    def _count(self, namespace: str, what: str):
+        with self._lock:
+            self._stats[namespace][what] += 1
+
+    def get_or_load(self, namespace: str, key: str, loader: Callable, ttl: Optional[int] = None):
+        """The cached value of `key`, or `loader()` stored under the namespace's current generation"""
+        generation_key = f"{KEY_PREFIX}{namespace}:generation"
+        value_key = f"{KEY_PREFIX}{namespace}:{key}"
+        try:
+            generation, cached = self.backend.get_many([generation_key, value_key])
+            generation = int(generation or 0)
+            if cached is not None:
+                cached_generation, value = pickle.loads(cached)
+                if cached_generation == generation:
+                    self._count(namespace, "hits")
+                    return value
+        except Exception:
+            self._count(namespace, "errors")
+            return loader()
+
+        self._count(namespace, "misses")
+        value = loader()
+        try:
+            self.backend.set(value_key, pickle.dumps((generation, value)), ttl or self.ttl)
+        except Exception:
+            self._count(namespace, "errors")
+        return value
+
+    def invalidate(self, namespace: str):
+        """Drop every entry of `namespace` on every replica"""
+        try:
+            self.backend.incr(f"{KEY_PREFIX}{namespace}:generation")
+            self._count(namespace, "invalidations")
+        except Exception:
+            self._count(namespace, "errors")
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            rows = []
+            for namespace, counts in sorted(self._stats.items()):
+                lookups = counts["hits"] + counts["misses"]
+                rows.append(dict(counts, namespace=namespace,
+                                 hit_rate=round(counts["hits"] / lookups, 3) if lookups else 0.0))
+            return rows
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """Return the process-wide shared cache for SHARED_CACHE_URL"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache(make_backend())
+        return _cache
@@ -0,0 +1,102 @@
+"""Text-to-speech with ElevenLabs in each persona's voice, served from the media store"""
+import itertools
+
+import streamlit as st
+
+from core import get_secret, lazy_import
+from fast_path import all_lines, start_presynthesis
+from media_store import get_media_store, synthesis_key
+from persona import DEFAULT_PERSONA, get_personality
+from tts_text import normalize_for_tts, chunk_for_tts, TTS_SAVINGS
+
+elevenlabs = lazy_import("elevenlabs")
+
+
+def clean_message_for_tts(message: str) -> str:
+    """Remove action descriptions, markdown and emoji and spell out numbers for text-to-speech"""
+    return normalize_for_tts(message)
+
+
+@st.cache_resource
+def get_voice(persona: str) -> "elevenlabs.Voice":
+    """A persona's ElevenLabs voice"""
+    voice = get_personality(persona)["voice"]
+    return elevenlabs.Voice(
+        voice_id=voice["voice_id"],
+        settings=elevenlabs.VoiceSettings(
+            stability=voice["stability"],
+            similarity_boost=voice["similarity_boost"],
+            style=voice["style"],
+            use_speaker_boost=voice["use_speaker_boost"]
+        )
+    )
+
+
+def presynthesize(message: str, persona: str):
+    """Put a line's audio in the media store ahead of time, under the key speak_message looks up"""
+    tts_message = clean_message_for_tts(message)
+    if not tts_message.strip():
+        return
+    voice = get_voice(persona)
+    store = get_media_store()
+    tts_key = synthesis_key(tts_message, voice.voice_id, str(voice.settings))
+    if store.lookup(tts_key) is None:
+        audio = b"".join(elevenlabs.generate(text=chunk, voice=voice) for chunk in chunk_for_tts(tts_message))
+        store.put(audio, "mp3", alias=tts_key)
+
+
+@st.cache_resource
+def warm_canned_audio(persona: str = DEFAULT_PERSONA):
+    """Once per process and persona: synthesize the fast path's canned lines in the background"""
+    personality = get_personality(persona)
+    if personality:
+        elevenlabs.set_api_key(get_secret("ELEVENLABS_API_KEY"))
+        return start_presynthesis(all_lines(personality), lambda line: presynthesize(line, persona))
+
+
+def speak_message(message: str, persona: str, trace=None):
+    """Generate and play text-to-speech audio"""
+    try:
+        # Set your Elevenlabs API key
+        elevenlabs.set_api_key(get_secret("ELEVENLABS_API_KEY"))
+
+        # Clean the message
+        tts_message = clean_message_for_tts(message)
+        savings = TTS_SAVINGS.record(message, tts_message)
+        if trace is not None:
+            trace.count("tts_chars_in", savings["original_chars"])
+            trace.count("tts_chars_billed", savings["billed_chars"])
+
+        if tts_message.strip():  # Only generate audio if there's text to speak
+            voice = get_voice(persona)
+
+            # Audio lives in a content-addressed store served over HTTP, so the
+            # page only carries a URL and repeated lines skip synthesis
+            store = get_media_store()
+            tts_key = synthesis_key(tts_message, voice.voice_id, str(voice.settings))
+            name = store.lookup(tts_key)
+            if name is not None and store.base_url:
+                # Cached (repeated or presynthesized) lines play straight away
+                st.audio(store.url(name), format='audio/mp3', autoplay=True)
+            elif store.base_url:
+                # Stream the synthesis so playback starts with the first chunk
+                # instead of after the whole reply has been rendered to MP3
+                # Long replies go out as several requests, played back to back
+                audio_stream = itertools.chain.from_iterable(
+                    elevenlabs.generate(text=chunk, voice=voice, stream=True)
+                    for chunk in chunk_for_tts(tts_message)
+                )
+                stream_id = store.start_stream(audio_stream, "mp3", alias=tts_key)
+                st.audio(store.stream_url(stream_id), format='audio/mp3', autoplay=True)
+            else:
+                # No public media URL: inline the bytes, still keeping them so repeats skip synthesis
+                audio = store.read(name) if name else None
+                if audio is None:
+                    audio = b"".join(
+                        elevenlabs.generate(text=chunk, voice=voice) for chunk in chunk_for_tts(tts_message)
+                    )
+                    store.put(audio, "mp3", alias=tts_key)
+                st.audio(audio, format='audio/mp3')
+
+    except Exception as e:
+        st.error(f"TTS Error: {str(e)}")
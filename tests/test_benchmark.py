@@ -0,0 +1,18 @@
+import pytest
+
+from benchmark import percentile
+
+
+@pytest.mark.parametrize("values, pct, expected", [
+    ([], 50, 0.0),
+    ([7], 99, 7),
+    ([1, 2], 50, 1),
+    ([2, 1], 100, 2),
+    (list(range(1, 11)), 90, 9),
+    (list(range(1, 11)), 95, 10),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 101)), 50, 50),
+    ([3, 1, 2], 0, 1),
+])
+def test_percentile_is_nearest_rank(values, pct, expected):
+    assert percentile(values, pct) == expected
@@ -0,0 +1,79 @@
+import pytest
+
+import fast_path
+from fast_path import all_lines, canned_reply, classify, persona_lines
+
+PERSONALITY = {
+    "conversation_style": {
+        "greetings": ['"Hey you!"'],
+        "responses": {"happy": ['"That makes me smile!"'], "sad": ['"Come here, tell me everything."']},
+    }
+}
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("hi", "greeting"),
+    ("hey babe, how are you?", "greeting"),
+    ("good morning", "greeting"),
+    ("I'm so happy today", "happy"),
+    ("feeling really down", "sad"),
+    ("i miss you", "sad"),
+])
+def test_simple_messages_are_classified(text, intent):
+    assert classify(text) == (intent, 1.0)
+
+
+@pytest.mark.parametrize("text", [
+    # Questions about a mood are not a statement of one
+    "is it bad?",
+    "are you sad",
+    "why am I so tired",
+    "was it great?",
+    # Acknowledgements depend on what came before
+    "yes",
+    "ok",
+    "lol",
+    # Too long to be explained by one intent
+    "hi there, I wanted to ask you something about my plans for the weekend",
+    "",
+])
+def test_false_positives_are_not_classified(text):
+    assert classify(text)[0] is None
+
+
+def test_mixed_message_is_below_the_confidence_threshold():
+    intent, confidence = classify("I'm sad my laptop broke")
+    assert intent == "sad"
+    assert confidence < fast_path.MIN_CONFIDENCE
+    assert canned_reply("I'm sad my laptop broke", PERSONALITY) is None
+
+
+def test_canned_reply_answers_from_the_persona():
+    assert canned_reply("hi", PERSONALITY) == "Hey you!"
+    assert canned_reply("so happy", PERSONALITY, previous="Hey you!") == "That makes me smile!"
+    assert canned_reply("feeling sad", PERSONALITY, previous="Hey you!") == "Come here, tell me everything."
+
+
+def test_greetings_are_only_answered_at_the_start():
+    assert canned_reply("hey", PERSONALITY, previous="Tell me more about your day.") is None
+
+
+def test_nothing_is_canned_after_an_assistant_question():
+    assert canned_reply("so happy", PERSONALITY, previous="How did the interview go? ") is None
+
+
+def test_the_previous_line_is_not_repeated():
+    assert canned_reply("so happy", PERSONALITY, previous="That makes me smile!") is None
+
+
+def test_disabled_or_missing_personality(monkeypatch):
+    assert canned_reply("hi", None) is None
+    monkeypatch.setattr(fast_path, "FAST_PATH_ENABLED", False)
+    assert canned_reply("hi", PERSONALITY) is None
+
+
+def test_coach_personality_format():
+    coach = {"coaching_style": {"conversation_style": {"greetings": ["Ready to work?"],
+                                                       "responses": {"supportive": ["Good job."]}}}}
+    assert persona_lines(coach) == {"greetings": ["Ready to work?"], "supportive": ["Good job."]}
+    assert all_lines(coach) == ["Ready to work?"]
@@ -0,0 +1,104 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import anthropic
+import pytest
+
+import llm_scheduler
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler
+
+
+def status_error(status, retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = SimpleNamespace(status_code=status, headers=headers, request=None)
+    return anthropic.APIStatusError(f"HTTP {status}", response=response, body=None)
+
+
+class FlakyClient:
+    """messages.create raises the queued errors in turn, then answers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.messages = self
+
+    def create(self, **request):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=10, output_tokens=5))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "RETRY_BASE", 0.0)
+
+
+def create(scheduler, client):
+    return scheduler.create(client, model="test", max_tokens=10, messages=[{"role": "user", "content": "hi"}])
+
+
+@pytest.mark.parametrize("error", [
+    status_error(500),
+    status_error(503),
+    status_error(529),
+    anthropic.APIConnectionError(request=None),
+])
+def test_server_and_connection_errors_are_retried(error):
+    scheduler = LLMScheduler(rpm=100, tpm=100000)
+    client = FlakyClient(error, error)
+    assert create(scheduler, client).usage.output_tokens == 5
+    assert client.calls == 3
+    assert scheduler.stats["retries"] == 2
+    assert scheduler.stats["rate_limited"] == 0
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(status):
+    scheduler = LLMScheduler(rpm=100, tpm=100000)
+    client = FlakyClient(status_error(status))
+    with pytest.raises(anthropic.APIStatusError):
+        create(scheduler, client)
+    assert client.calls == 1
+
+
+def test_retries_give_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_MAX_RETRIES", 2)
+    scheduler = LLMScheduler(rpm=100, tpm=100000)
+    client = FlakyClient(*[status_error(500)] * 5)
+    with pytest.raises(anthropic.APIStatusError):
+        create(scheduler, client)
+    assert client.calls == 3
+
+
+def test_only_rate_limits_pause_admission():
+    scheduler = LLMScheduler(rpm=100, tpm=100000)
+    assert scheduler.backoff(status_error(503, retry_after="5"), 0) >= 5
+    assert scheduler._paused_until == 0.0
+
+    assert scheduler.backoff(status_error(429, retry_after="5"), 0) >= 5
+    assert scheduler._paused_until > time.monotonic() + 4
+    assert scheduler.stats["rate_limited"] == 1
+
+
+def test_interactive_calls_are_admitted_before_background_ones():
+    scheduler = LLMScheduler(rpm=100, tpm=100000)
+    scheduler._paused_until = time.monotonic() + 0.2
+    admitted = []
+
+    def call(name, priority):
+        scheduler.acquire(10, priority)
+        admitted.append(name)
+
+    threads = []
+    for name, priority in [("background 1", BACKGROUND), ("background 2", BACKGROUND), ("interactive", INTERACTIVE)]:
+        threads.append(threading.Thread(target=call, args=(name, priority)))
+        threads[-1].start()
+        # Queue them in this order
+        while len(scheduler._queue) < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert admitted == ["interactive", "background 1", "background 2"]
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from chat_storage import CloudChatStorage
+from fakes import FakeDatabase
+from maintenance import COLD_COLLECTION, archive_old_conversations, merge_into_archive
+from message_writer import new_message_id
+
+
+def days_ago(days):
+    return datetime.now() - timedelta(days=days)
+
+
+def make_storage():
+    storage = CloudChatStorage.__new__(CloudChatStorage)
+    storage.db = FakeDatabase("chat_history")
+    storage.cached_listing = False
+    return storage
+
+
+def say(storage, conversation_id, content, days):
+    storage.save_message(conversation_id, "user", content, message_id=new_message_id(),
+                         timestamp=days_ago(days))
+
+
+def test_old_conversation_still_in_use_is_kept():
+    storage = make_storage()
+    conversation_id = ObjectId()
+    say(storage, conversation_id, "hello", 200)
+    say(storage, conversation_id, "still here", 1)
+
+    assert archive_old_conversations(storage.db, archive_days=90) == 0
+    assert len(storage.get_conversation_history(conversation_id)) == 2
+
+
+def test_legacy_conversation_without_updated_at_uses_message_times():
+    storage = make_storage()
+    storage.db.conversations.insert_one({
+        "_id": "legacy", "timestamp": days_ago(200),
+        "messages": [{"role": "user", "content": "hi", "timestamp": days_ago(200)},
+                     {"role": "user", "content": "back", "timestamp": days_ago(2)}],
+    })
+    assert archive_old_conversations(storage.db, archive_days=90) == 0
+    storage.db.conversations.update_one({"_id": "legacy"}, {"$unset": {"messages": 1}})
+    assert archive_old_conversations(storage.db, archive_days=90) == 1
+
+
+def test_archived_then_resumed_then_archived_again():
+    storage = make_storage()
+    cold = storage.db[COLD_COLLECTION]
+    conversation_id = ObjectId()
+    say(storage, conversation_id, "first", 200)
+    say(storage, conversation_id, "second", 199)
+    assert archive_old_conversations(storage.db, archive_days=90) == 1
+
+    # Resumed: save_message recreates the hot document
+    say(storage, conversation_id, "third", 100)
+    say(storage, conversation_id, "fourth", 99)
+    assert archive_old_conversations(storage.db, archive_days=90) == 1
+
+    assert storage.get_conversation_history(conversation_id) == []
+    archived = cold.find_one({"_id": conversation_id})
+    assert [m["content"] for m in archived["messages"]] == ["first", "second", "third", "fourth"]
+    assert archived["message_count"] == 4
+
+
+def test_merge_is_not_repeated_after_an_interrupted_run():
+    storage = make_storage()
+    cold = storage.db[COLD_COLLECTION]
+    conversation_id = ObjectId()
+    say(storage, conversation_id, "first", 200)
+    archive_old_conversations(storage.db, archive_days=90)
+    say(storage, conversation_id, "again", 100)
+
+    # The merge landed but the delete did not
+    hot = storage.db.conversations.find_one({"_id": conversation_id})
+    merge_into_archive(cold, hot, datetime.now())
+    assert archive_old_conversations(storage.db, archive_days=90) == 1
+
+    archived = cold.find_one({"_id": conversation_id})
+    assert [m["content"] for m in archived["messages"]] == ["first", "again"]
+    assert archived["message_count"] == 2
+
+
+def test_message_saved_during_archiving_keeps_the_conversation_hot():
+    storage = make_storage()
+    hot = storage.db.conversations
+    cold = storage.db[COLD_COLLECTION]
+    stays, goes = ObjectId(), ObjectId()
+    for conversation_id in (stays, goes):
+        say(storage, conversation_id, "first", 200)
+
+    # One conversation gets a message between the cold copy and the delete
+    delete_many = hot.delete_many
+
+    def delete_after_a_reply(filter):
+        say(storage, stays, "a reply just now", 0)
+        return delete_many(filter)
+
+    hot.delete_many = delete_after_a_reply
+    assert archive_old_conversations(storage.db, archive_days=90) == 1
+    del hot.delete_many
+
+    assert [m["content"] for m in storage.get_conversation_history(stays)] == ["first", "a reply just now"]
+    assert cold.find_one({"_id": stays}) is None
+    assert cold.find_one({"_id": goes}) is not None
+
+
+def test_message_saved_during_a_merge_keeps_the_cold_copy_unchanged():
+    storage = make_storage()
+    hot = storage.db.conversations
+    cold = storage.db[COLD_COLLECTION]
+    conversation_id = ObjectId()
+    say(storage, conversation_id, "first", 200)
+    archive_old_conversations(storage.db, archive_days=90)
+    say(storage, conversation_id, "resumed", 100)
+
+    delete_many = hot.delete_many
+
+    def delete_after_a_reply(filter):
+        say(storage, conversation_id, "a reply just now", 0)
+        return delete_many(filter)
+
+    hot.delete_many = delete_after_a_reply
+    assert archive_old_conversations(storage.db, archive_days=90) == 0
+    del hot.delete_many
+
+    archived = cold.find_one({"_id": conversation_id})
+    assert [m["content"] for m in archived["messages"]] == ["first"]
+    assert archived["message_count"] == 1
+    assert len(storage.get_conversation_history(conversation_id)) == 2
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from message_writer import MessageWriter, PendingMessage
+
+
+class Store:
+    """Saves messages into a list, failing the first `failures` attempts"""
+
+    def __init__(self, failures=0, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.saved = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, message):
+        self.release.wait(5)
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("not reachable")
+        self.saved.append((message.conversation_id, message.content))
+
+
+def message(store, content, conversation="c1"):
+    return PendingMessage(conversation, "user", content, None, store)
+
+
+def test_messages_of_a_conversation_are_saved_in_order():
+    store = Store(delay=0.001)
+    writer = MessageWriter(workers=4, attempts=3, backoff=0)
+    for i in range(20):
+        writer.submit(message(store, i, conversation="a"))
+        writer.submit(message(store, i, conversation="b"))
+    assert writer.flush()
+
+    for conversation in ("a", "b"):
+        assert [content for c, content in store.saved if c == conversation] == list(range(20))
+    assert writer.stats()["saved"] == 40
+    assert writer.status("a") == {"state": "saved", "pending": 0, "error": None, "dropped": 0}
+
+
+def test_failed_write_is_retried():
+    store = Store(failures=2)
+    writer = MessageWriter(workers=1, attempts=3, backoff=0)
+    writer.submit(message(store, "hi"))
+    assert writer.flush()
+    assert store.saved == [("c1", "hi")]
+    assert writer.stats()["retries"] == 2
+
+
+def test_conversation_waits_after_retries_run_out():
+    store = Store(failures=3)
+    writer = MessageWriter(workers=1, attempts=2, backoff=0)
+    writer.submit(message(store, "first"))
+    writer.submit(message(store, "second"))
+    assert not writer.flush()
+    status = writer.status("c1")
+    assert status["state"] == "failed" and status["pending"] == 2
+    assert status["error"] == "not reachable"
+    assert [m["content"] for m in writer.with_pending("c1", [])] == ["first", "second"]
+
+    # One failure left; a manual retry starts the attempts over
+    writer.retry("c1")
+    assert writer.flush()
+    assert store.saved == [("c1", "first"), ("c1", "second")]
+
+
+def test_discard_drops_queued_and_later_messages():
+    store = Store()
+    store.release.clear()
+    writer = MessageWriter(workers=1, attempts=3, backoff=0)
+    for content in ("in flight", "queued", "queued too"):
+        writer.submit(message(store, content))
+    while not writer.pending("c1") or writer.pending("c1")[0].attempts == 0:
+        time.sleep(0.001)
+
+    threading.Timer(0.05, store.release.set).start()
+    assert writer.discard("c1")
+    # The save under way finishes before discard returns; nothing after it is stored
+    assert store.saved == [("c1", "in flight")]
+
+    writer.submit(message(store, "reply of a running turn"))
+    assert writer.flush()
+    assert store.saved == [("c1", "in flight")]
+    assert writer.status("c1") == {"state": "discarded", "pending": 0, "error": None, "dropped": 3}
+
+
+def test_discard_leaves_other_conversations_alone():
+    store = Store()
+    writer = MessageWriter(workers=2, attempts=3, backoff=0)
+    writer.discard("gone")
+    writer.submit(message(store, "dropped", conversation="gone"))
+    writer.submit(message(store, "kept", conversation="kept"))
+    assert writer.flush()
+    assert store.saved == [("kept", "kept")]
+    assert writer.stats()["dropped"] == 1
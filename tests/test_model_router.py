@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from model_router import DEFAULT_RULES, ModelRouter, cost_usd, is_cacheable, load_rules
+
+MEDIUM = "I went to the market today and bought some apples, then walked home along the river with my dog"
+SHORT = "I had a nice walk with the dog"
+
+
+@pytest.fixture
+def router():
+    return ModelRouter(rules=dict(DEFAULT_RULES), fast_model="fast", heavy_model="heavy")
+
+
+@pytest.mark.parametrize("prompt, history, profile, route, reason", [
+    ("hi", 0, None, "fast", "smalltalk"),
+    ("thanks so much!", 0, None, "fast", "smalltalk"),
+    ("good morning my love", 60, "business_coach.txt", "fast", "smalltalk"),
+    ("why do I keep procrastinating?", 0, None, "heavy", "intent"),
+    ("can you help me decide", 0, None, "heavy", "intent"),
+    ("a" * 401, 0, None, "heavy", "long"),
+    ("a" * 400, 0, None, "fast", "default"),
+    (MEDIUM, 0, "career_coach.txt", "heavy", "profile"),
+    (SHORT, 0, "career_coach.txt", "fast", "default"),
+    (MEDIUM, 0, "friendly.txt", "fast", "default"),
+    (MEDIUM, 40, None, "heavy", "history"),
+    (MEDIUM, 39, None, "fast", "default"),
+    (SHORT, 100, None, "fast", "default"),
+])
+def test_route(router, prompt, history, profile, route, reason):
+    chosen = router.route(prompt, history_length=history, profile=profile)
+    assert (chosen.name, chosen.model, chosen.reason) == (route, route, reason)
+
+
+def test_short_chars_threshold_is_inclusive(router):
+    assert router.route("b" * 80, history_length=40).name == "fast"
+    assert router.route("b" * 81, history_length=40).name == "heavy"
+
+
+def test_rules_file_overrides_defaults(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"long_chars": 50}))
+    rules = load_rules(str(path))
+    assert rules["long_chars"] == 50
+    assert rules["short_chars"] == DEFAULT_RULES["short_chars"]
+    assert ModelRouter(rules=rules).route("c" * 51).reason == "long"
+
+
+def test_cost_and_cacheable_prefix():
+    usage = {"input_tokens": 1_000_000, "cache_read_input_tokens": 1_000_000, "output_tokens": 1_000_000}
+    assert cost_usd("claude-3-5-haiku-20241022", usage) == pytest.approx(0.8 + 0.08 + 4.0)
+    assert cost_usd("unknown-model", usage) == 0.0
+    assert not is_cacheable("x" * 4 * 2000, "claude-3-5-haiku-20241022")
+    assert is_cacheable("x" * 4 * 2000, "claude-3-opus-20240229")
@@ -0,0 +1,80 @@
+import pytest
+
+from shared_cache import FileBackend, MemoryBackend, SharedCache, make_backend
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class BrokenBackend:
+    def get_many(self, keys):
+        raise ConnectionError("down")
+
+    def set(self, key, value, ttl):
+        raise ConnectionError("down")
+
+    def incr(self, key):
+        raise ConnectionError("down")
+
+
+@pytest.fixture(params=["memory", "file"])
+def backend(request, tmp_path):
+    return MemoryBackend() if request.param == "memory" else FileBackend(str(tmp_path))
+
+
+def test_invalidation_on_one_replica_reaches_the_other(backend):
+    replica_a, replica_b = SharedCache(backend), SharedCache(backend)
+    load = Loader(["first"])
+    assert replica_a.get_or_load("listing", "user", load) == ["first"]
+    assert replica_b.get_or_load("listing", "user", load) == ["first"]
+    assert load.calls == 1
+
+    replica_a.invalidate("listing")
+    load.value = ["second"]
+    assert replica_b.get_or_load("listing", "user", load) == ["second"]
+    assert replica_a.get_or_load("listing", "user", load) == ["second"]
+    assert load.calls == 2
+    assert replica_b.stats()[0]["hits"] == 1
+
+
+def test_invalidation_is_per_namespace(backend):
+    cache = SharedCache(backend)
+    cache.get_or_load("listing", "user", Loader(1))
+    cache.get_or_load("personas", "all", Loader(2))
+    cache.invalidate("listing")
+
+    personas = Loader(3)
+    assert cache.get_or_load("personas", "all", personas) == 2
+    assert personas.calls == 0
+
+
+def test_invalidations_from_several_workers_all_count(tmp_path):
+    backends = [FileBackend(str(tmp_path)) for _ in range(3)]
+    for _ in range(5):
+        for backend in backends:
+            backend.incr("chatcache:listing:generation")
+    assert backends[0].incr("chatcache:listing:generation") == 16
+
+
+def test_backend_errors_fall_back_to_the_loader():
+    cache = SharedCache(BrokenBackend())
+    load = Loader("value")
+    assert cache.get_or_load("listing", "user", load) == "value"
+    assert cache.get_or_load("listing", "user", load) == "value"
+    cache.invalidate("listing")
+    assert load.calls == 2
+    assert cache.stats()[0]["errors"] == 3
+
+
+def test_make_backend(tmp_path):
+    assert isinstance(make_backend(""), MemoryBackend)
+    assert isinstance(make_backend(f"file://{tmp_path}"), FileBackend)
+    with pytest.raises(ValueError):
+        make_backend("ftp://example.com")
@@ -0,0 +1,37 @@
+import pytest
+
+from tts_text import normalize_for_tts
+
+CASES = [
+    # Numbers, prices, times and versions are left for the TTS engine to read
+    ("It costs $5.99 today", "It costs $5.99 today"),
+    ("You came 1st!", "You came 1st!"),
+    ("See you at 5:30pm", "See you at 5:30pm"),
+    ("Update to 3.10.2 first", "Update to 3.10.2 first"),
+    ("That's 50% off", "That's 50% off"),
+    ("Call me on 555-123-4567", "Call me on 555-123-4567"),
+    # Angle brackets and underscores that are not markup stay
+    ("x<y and z>w", "x<y and z>w"),
+    ("the old_and new", "the old_and new"),
+    ("5*3 and 2*4", "5*3 and 2*4"),
+    # Markup, actions, links and emoji go
+    ("*smiles warmly* Hi there", "Hi there"),
+    ("That is **so** _nice_", "That is so nice"),
+    ("<b>bold</b> and <span class=\"x\">styled</span>", "bold and styled"),
+    ("Read [this](https://example.com) later", "Read this later"),
+    ("Go to https://example.com now", "Go to now"),
+    ("# Title\n> quoted line", "Title quoted line"),
+    ("Love you 😘💕", "Love you"),
+    ("Miss you 😘 ! See you *waves* .", "Miss you! See you."),
+    # SSML the engine understands is kept; abbreviations are expanded
+    ("Wait <break time=\"1s\"/> okay", "Wait <break time=\"1s\"/> okay"),
+    ("Dr. Smith, e.g. tomorrow", "doctor Smith, for example tomorrow"),
+    ("Cats, dogs etc. Then we left", "Cats, dogs et cetera. Then we left"),
+    ("Cats, dogs etc.", "Cats, dogs et cetera."),
+    ("Cats, dogs etc. and more", "Cats, dogs et cetera and more"),
+]
+
+
+@pytest.mark.parametrize("message, expected", CASES)
+def test_normalize_for_tts(message, expected):
+    assert normalize_for_tts(message) == expected
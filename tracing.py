@@ -0,0 +1,315 @@
+import streamlit as st
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from message_writer import get_writer
+from model_router import cost_usd, get_router
+from mongo_pool import get_pool_stats
+from shared_cache import get_shared_cache
+from tts_text import TTS_SAVINGS
+
+# Where finished turn traces go. Leave unset to keep tracing in memory only.
+TRACE_FILE = os.getenv("TRACE_FILE")
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Histogram bucket bounds (seconds) for the Prometheus export
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages shown in the debug panel, in pipeline order
+STAGES = ["memory", "prompt_build", "llm_ttft", "llm_total", "tts", "queue_message", "render"]
+
+
+class TurnTrace:
+    """Timing spans and token counts for a single chat turn"""
+
+    def __init__(self, app: str, conversation_id=None):
+        self.app = app
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.conversation_id = str(conversation_id) if conversation_id else None
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+        self.model = None
+        # Model route chosen for the turn ("fast"/"heavy"), if routed
+        self.route = None
+        self.error = None
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a block; repeated spans with the same name add up"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.spans[name] = self.spans.get(name, 0.0) + elapsed
+
+    def mark(self, name: str, since: float):
+        """Record the time from `since` (a perf_counter value) until now"""
+        self.spans[name] = (time.perf_counter() - since) * 1000
+
+    def count(self, name: str, value: int = 1):
+        """Add to a per-turn counter (e.g. characters sent to TTS)"""
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def record_usage(self, usage, model: Optional[str] = None):
+        """Copy token counts from an Anthropic `response.usage` object"""
+        if model:
+            self.model = model
+        if usage is None:
+            return
+        for field in ("input_tokens", "output_tokens",
+                      "cache_creation_input_tokens", "cache_read_input_tokens"):
+            value = getattr(usage, field, None)
+            if value:
+                self.tokens[field] = self.tokens.get(field, 0) + int(value)
+
+    def to_dict(self) -> Dict:
+        return {
+            "turn_id": self.turn_id,
+            "app": self.app,
+            "conversation_id": self.conversation_id,
+            "timestamp": self.started_at.isoformat(),
+            "model": self.model,
+            "route": self.route,
+            "cost_usd": round(cost_usd(self.model, self.tokens), 6),
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 2),
+            "spans_ms": {k: round(v, 2) for k, v in self.spans.items()},
+            "tokens": dict(self.tokens),
+            "counts": dict(self.counts),
+            "error": self.error,
+        }
+
+
+class TraceExporter:
+    """Process-wide sink for finished traces (JSON lines + Prometheus text)"""
+
+    def __init__(self, trace_file: Optional[str] = None, metrics_file: Optional[str] = None):
+        self.trace_file = trace_file
+        self.metrics_file = metrics_file
+        self._lock = threading.Lock()
+        # (app, stage) -> [bucket counts..., sum, count]
+        self._histograms: Dict[tuple, List[float]] = {}
+        self._tokens: Dict[tuple, int] = {}
+        self._counts: Dict[tuple, int] = {}
+        self._turns: Dict[tuple, int] = {}
+        # (app, route, model) -> [turns, cost in USD]
+        self._routes: Dict[tuple, List[float]] = {}
+        self.recent = deque(maxlen=200)
+
+    def export(self, trace: TurnTrace) -> Dict:
+        record = trace.to_dict()
+        with self._lock:
+            self.recent.append(record)
+            status = (trace.app, "error" if trace.error else "ok")
+            self._turns[status] = self._turns.get(status, 0) + 1
+            for stage, ms in record["spans_ms"].items():
+                self._observe(trace.app, stage, ms / 1000)
+            self._observe(trace.app, "turn", record["total_ms"] / 1000)
+            for kind, count in record["tokens"].items():
+                key = (trace.app, kind)
+                self._tokens[key] = self._tokens.get(key, 0) + count
+            for kind, count in record["counts"].items():
+                key = (trace.app, kind)
+                self._counts[key] = self._counts.get(key, 0) + count
+            if trace.route:
+                route = self._routes.setdefault((trace.app, trace.route, trace.model), [0, 0.0])
+                route[0] += 1
+                route[1] += record["cost_usd"]
+                if "llm_total" in record["spans_ms"]:
+                    self._observe(trace.app, f"llm_total:{trace.route}", record["spans_ms"]["llm_total"] / 1000)
+
+            if self.trace_file:
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            if self.metrics_file:
+                tmp_path = f"{self.metrics_file}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(self._render_prometheus())
+                os.replace(tmp_path, self.metrics_file)
+        return record
+
+    def _observe(self, app: str, stage: str, seconds: float):
+        hist = self._histograms.setdefault((app, stage), [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            return self._render_prometheus()
+
+    def _render_prometheus(self) -> str:
+        lines = [
+            "# HELP chat_turn_stage_seconds Time spent per chat turn stage",
+            "# TYPE chat_turn_stage_seconds histogram",
+        ]
+        for (app, stage), hist in sorted(self._histograms.items()):
+            labels = f'app="{app}",stage="{stage}"'
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                lines.append(f'chat_turn_stage_seconds_bucket{{{labels},le="{bound}"}} {hist[i]}')
+            lines.append(f'chat_turn_stage_seconds_bucket{{{labels},le="+Inf"}} {hist[-1]}')
+            lines.append(f"chat_turn_stage_seconds_sum{{{labels}}} {hist[-2]:.6f}")
+            lines.append(f"chat_turn_stage_seconds_count{{{labels}}} {hist[-1]}")
+
+        lines.append("# HELP chat_turn_tokens_total Tokens reported by response.usage")
+        lines.append("# TYPE chat_turn_tokens_total counter")
+        for (app, kind), count in sorted(self._tokens.items()):
+            lines.append(f'chat_turn_tokens_total{{app="{app}",kind="{kind}"}} {count}')
+
+        lines.append("# HELP chat_turn_count_total Per-turn counters (e.g. TTS characters)")
+        lines.append("# TYPE chat_turn_count_total counter")
+        for (app, kind), count in sorted(self._counts.items()):
+            lines.append(f'chat_turn_count_total{{app="{app}",kind="{kind}"}} {count}')
+
+        lines.append("# HELP chat_route_turns_total Turns per model route")
+        lines.append("# TYPE chat_route_turns_total counter")
+        for (app, route, model), (turns, _) in sorted(self._routes.items(), key=lambda item: str(item[0])):
+            lines.append(f'chat_route_turns_total{{app="{app}",route="{route}",model="{model or ""}"}} {turns}')
+        lines.append("# HELP chat_route_cost_usd_total Estimated spend per model route")
+        lines.append("# TYPE chat_route_cost_usd_total counter")
+        for (app, route, model), (_, cost) in sorted(self._routes.items(), key=lambda item: str(item[0])):
+            lines.append(f'chat_route_cost_usd_total{{app="{app}",route="{route}",model="{model or ""}"}} {cost:.6f}')
+
+        lines.append("# HELP chat_turns_total Finished chat turns")
+        lines.append("# TYPE chat_turns_total counter")
+        for (app, status), count in sorted(self._turns.items()):
+            lines.append(f'chat_turns_total{{app="{app}",status="{status}"}} {count}')
+
+        lines.append("# HELP chat_shared_cache_ops_total Shared cache lookups, invalidations and backend errors")
+        lines.append("# TYPE chat_shared_cache_ops_total counter")
+        for row in get_shared_cache().stats():
+            for op in ("hits", "misses", "invalidations", "errors"):
+                lines.append(f'chat_shared_cache_ops_total{{namespace="{row["namespace"]}",op="{op}"}} {row[op]}')
+        tts = TTS_SAVINGS.summary()
+        lines.append("# HELP chat_tts_chars_total Characters of replies sent to TTS, before and after normalization")
+        lines.append("# TYPE chat_tts_chars_total counter")
+        lines.append(f'chat_tts_chars_total{{kind="original"}} {tts["original_chars"]}')
+        lines.append(f'chat_tts_chars_total{{kind="billed"}} {tts["billed_chars"]}')
+        lines.extend(get_writer().prometheus_lines())
+        lines.extend(get_pool_stats().prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/metrics":
+            body = get_exporter().prometheus_text().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif path == "/health":
+            body = json.dumps({"mongo_pool": get_pool_stats().health()}).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> TraceExporter:
+    """Return the shared exporter, starting the metrics endpoint if configured"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = TraceExporter(TRACE_FILE, METRICS_FILE)
+            if METRICS_PORT:
+                server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+        return _exporter
+
+
+def finish_trace(trace: TurnTrace):
+    """Export a finished trace and keep it for the debug panel"""
+    record = get_exporter().export(trace)
+    if trace.route and "llm_total" in trace.spans:
+        get_router().record(trace.route, trace.model, trace.spans["llm_total"] / 1000, trace.tokens)
+    if "traces" not in st.session_state:
+        st.session_state.traces = deque(maxlen=20)
+    st.session_state.traces.append(record)
+
+
+def debug_panel_enabled() -> bool:
+    """The debug panel shows with DEBUG_PANEL=1 or ?debug=1 in the URL"""
+    return os.getenv("DEBUG_PANEL") == "1" or st.query_params.get("debug") == "1"
+
+
+def render_debug_panel():
+    """Sidebar panel with per-stage timings of this session's recent turns"""
+    if not debug_panel_enabled():
+        return
+    traces = st.session_state.get("traces")
+    with st.sidebar.expander("Debug: Turn Timing", expanded=True):
+        if not traces:
+            st.write("No turns recorded yet.")
+            return
+
+        last = traces[-1]
+        route = f", {last['route']} route" if last.get("route") else ""
+        st.write(f"Last turn: {last['total_ms']:.0f} ms ({last['model']}{route}, ${last.get('cost_usd', 0):.4f})")
+        st.table([
+            {"stage": stage, "ms": round(last["spans_ms"][stage], 1)}
+            for stage in STAGES if stage in last["spans_ms"]
+        ])
+        if last["tokens"]:
+            st.write("Tokens: " + ", ".join(f"{k}={v}" for k, v in last["tokens"].items()))
+        if last["counts"]:
+            st.write("Counts: " + ", ".join(f"{k}={v}" for k, v in last["counts"].items()))
+        if last["error"]:
+            st.write(f"Error: {last['error']}")
+
+        if len(traces) > 1:
+            st.write(f"Average over last {len(traces)} turns:")
+            st.table([
+                {"stage": stage,
+                 "ms": round(sum(t["spans_ms"].get(stage, 0.0) for t in traces) / len(traces), 1)}
+                for stage in STAGES
+            ])
+
+        routes = get_router().summary()
+        if routes:
+            st.write("Model routes (this process):")
+            st.table(routes)
+
+        shared = get_shared_cache().stats()
+        if shared:
+            st.write("Shared cache (this process):")
+            st.table(shared)
+
+        tts = TTS_SAVINGS.summary()
+        if tts["requests"]:
+            st.write("TTS characters (this process):")
+            st.table([tts])
+
+        writes = get_writer().stats()
+        if writes["saved"] or writes["pending"]:
+            st.write("Message writes (this process):")
+            st.table([writes])
+
+        pool = get_pool_stats().health()
+        if pool["created"] or pool["commands"]:
+            st.write("MongoDB pool (this process):")
+            st.table([pool])
@@ -0,0 +1,109 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+# Role codes stored in the transcript's role array
+ROLES = ("user", "assistant")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+class Message:
+    """A single transcript entry; supports dict-style access for existing code"""
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Message, dict)):
+            return self.role == other["role"] and self.content == other["content"]
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content!r})"
+
+
+class Transcript:
+    """Compact chat history: one UTF-8 text buffer plus role and offset arrays
+
+    A list of {"role", "content"} dicts costs a dict and a str object per
+    message. Here each message costs its encoded text, one role byte and one
+    end offset, and messages are decoded on access.
+    """
+    __slots__ = ("_roles", "_ends", "_buffer")
+
+    def __init__(self, messages: Optional[Iterable[Union[Dict, Message]]] = None):
+        self._roles = array("B")
+        self._ends = array("I")
+        self._buffer = bytearray()
+        for message in messages or ():
+            self.append(message)
+
+    def append(self, message: Union[Dict, Message]):
+        """Add a message given as a dict (extra keys such as timestamps are dropped) or Message"""
+        self.add(message["role"], message["content"])
+
+    def add(self, role: str, content: str):
+        self._buffer += content.encode("utf-8")
+        self._roles.append(ROLE_CODES[role])
+        self._ends.append(len(self._buffer))
+
+    def extend(self, messages: Iterable[Union[Dict, Message]]):
+        for message in messages:
+            self.append(message)
+
+    def clear(self):
+        self._roles = array("B")
+        self._ends = array("I")
+        self._buffer = bytearray()
+
+    def _message(self, index: int) -> Message:
+        start = self._ends[index - 1] if index else 0
+        return Message(ROLES[self._roles[index]], self._buffer[start:self._ends[index]].decode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def __bool__(self) -> bool:
+        return len(self._roles) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Transcript(self._message(i) for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transcript index out of range")
+        return self._message(index)
+
+    def __iter__(self) -> Iterator[Message]:
+        for index in range(len(self)):
+            yield self._message(index)
+
+    def to_api(self) -> List[Dict[str, str]]:
+        """Messages in the shape the Anthropic Messages API expects"""
+        return [message.to_dict() for message in self]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the transcript's buffers"""
+        return (len(self._buffer) + self._roles.itemsize * len(self._roles)
+                + self._ends.itemsize * len(self._ends))
+
+    def __repr__(self) -> str:
+        return f"Transcript({len(self)} messages, {len(self._buffer)} bytes)"
@@ -0,0 +1,137 @@
+import re
+import threading
+from typing import Dict, List
+
+# ElevenLabs bills per input character, so everything that is never spoken
+# (actions, markdown, emoji, links) is stripped before synthesis. Numbers,
+# prices, times, ordinals and phone numbers are left as written: the engine
+# reads them correctly, and spelling them out would only add billed characters.
+
+# Longest text sent in a single TTS request; longer replies are chunked
+MAX_CHUNK_CHARS = 2500
+
+ABBREVIATIONS = {
+    "dr.": "doctor", "mr.": "mister", "mrs.": "missus", "ms.": "miz", "st.": "saint",
+    "jr.": "junior", "sr.": "senior", "vs.": "versus", "etc.": "et cetera",
+    "approx.": "approximately", "e.g.": "for example", "i.e.": "that is",
+}
+# Abbreviations whose period can also end the sentence ("...and so on etc. Then")
+SENTENCE_FINAL_ABBREVIATIONS = {"etc.", "jr.", "sr."}
+
+# HTML tags worth stripping; anything else in angle brackets (x<y, z>w) is real text
+_HTML_TAGS = ("a|abbr|b|blockquote|br|code|del|div|em|h[1-6]|hr|i|img|ins|kbd|li|mark|ol|p|pre|"
+              "s|small|span|strike|strong|sub|sup|u|ul")
+
+# One alternation, compiled once, handles every rule in a single scan.
+# SSML tags ElevenLabs understands (<break/>, <phoneme>) are kept verbatim.
+# Markdown markers only count next to a word boundary, so snake_case and
+# arithmetic survive.
+_TTS_PATTERN = re.compile(r"""
+    (?P<ssml></?(?:break|phoneme)\b[^>]*>)
+  | (?P<action>(?<![\w*])\*[^*\n]+\*(?![\w*]))
+  | (?P<link>\[(?P<link_text>[^\]]*)\]\([^)]*\))
+  | (?P<url>(?:https?://|www\.)\S*[^\s.,!?;:)])
+  | (?P<tag></?(?:""" + _HTML_TAGS + r""")(?:\s[^<>\n]*)?/?>)
+  | (?P<heading>^[ \t]*(?:\#{1,6}|>+)[ \t]+)
+  | (?P<markup>(?<!\w)(?:\*\*|__|[*_~`])+|(?:\*\*|__|[*_~`])+(?!\w)|(?<!\S)\|+(?!\S))
+  | (?P<emoji>[\U0001F000-\U0001FAFF\U0001F1E6-\U0001F1FF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\u20E3]+)
+  | (?P<abbr>\b(?:[Dd]r|[Mm]rs?|[Mm]s|[Ss]t|[Jj]r|[Ss]r|vs|etc|approx)\.|\b[Ee]\.g\.|\b[Ii]\.e\.)
+  | (?P<space>\s{2,}|[^\S ])
+""", re.VERBOSE | re.MULTILINE | re.IGNORECASE)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# What follows an abbreviation that ends its sentence: the end, a new line or a capital
+_NEXT_SENTENCE = re.compile(r"[ \t]*(?:$|\n|[ \t][A-Z])")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r" +(?=[.,!?])")
+
+
+def normalize_for_tts(message: str) -> str:
+    """Strip actions, markdown, links, HTML tags and emoji and expand abbreviations, in one pass"""
+    pieces: List[str] = []
+    position = 0
+    for match in _TTS_PATTERN.finditer(message):
+        if match.start() > position:
+            pieces.append(message[position:match.start()])
+        position = match.end()
+
+        kind = match.lastgroup
+        if kind == "space":
+            if pieces and not pieces[-1].endswith(" "):
+                pieces.append(" ")
+        elif kind == "link_text" or kind == "link":
+            pieces.append(match.group("link_text"))
+        elif kind == "ssml":
+            pieces.append(match.group("ssml"))
+        elif kind == "abbr":
+            abbr = match.group("abbr").lower()
+            pieces.append(ABBREVIATIONS.get(abbr, match.group("abbr")))
+            if abbr in SENTENCE_FINAL_ABBREVIATIONS and _NEXT_SENTENCE.match(message, position):
+                # Keep the full stop, or the next sentence runs on without a pause
+                pieces.append(".")
+        elif message[position:position + 1] == " " and (not pieces or pieces[-1].endswith(" ")):
+            # Dropped span (action, url, tag, markup, emoji): don't leave a double space
+            position += 1
+    pieces.append(message[position:])
+
+    cleaned = "".join(pieces)
+    # Removed spans can leave a space before punctuation or at the ends
+    return _SPACE_BEFORE_PUNCTUATION.sub("", cleaned).strip()
+
+
+def chunk_for_tts(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
+    """Split text at sentence boundaries into chunks of at most `max_chars`"""
+    if len(text) <= max_chars:
+        return [text] if text else []
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class CharacterSavings:
+    """Running totals of characters received vs. characters billed for TTS"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.original = 0
+        self.billed = 0
+        self.requests = 0
+
+    def record(self, original: str, billed: str) -> Dict[str, float]:
+        """Add one message and return its own savings"""
+        with self._lock:
+            self.original += len(original)
+            self.billed += len(billed)
+            self.requests += 1
+        return _savings(len(original), len(billed))
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(_savings(self.original, self.billed), requests=self.requests)
+
+
+def _savings(original: int, billed: int) -> Dict[str, float]:
+    return {
+        "original_chars": original,
+        "billed_chars": billed,
+        "saved_chars": original - billed,
+        "saved_pct": round(100.0 * (original - billed) / original, 1) if original else 0.0,
+    }
+
+
+# Process-wide savings counter shown in the debug panel
+TTS_SAVINGS = CharacterSavings()
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import streamlit as st
+
+from tracing import TurnTrace
+
+# Replies generating at once across all sessions of this process
+TURN_WORKERS = int(os.getenv("TURN_WORKERS", "16"))
+# Longest the UI waits between redraws while a reply is arriving
+RENDER_INTERVAL = 0.05
+CURSOR = " ▌"
+
+
+class Turn:
+    """An assistant reply generating in a background thread
+
+    Lives in session state, so a rerun (sidebar click, new input) interrupts
+    only the rendering; the next run reattaches and keeps the text so far.
+    """
+
+    def __init__(self, trace: TurnTrace, conversation_id=None):
+        self.id = uuid.uuid4().hex
+        self.trace = trace
+        self.conversation_id = conversation_id
+        self.done = False
+        self.error: Optional[Exception] = None
+        self._parts = []
+        self._cond = threading.Condition()
+
+    @property
+    def text(self) -> str:
+        with self._cond:
+            return "".join(self._parts)
+
+    def feed(self, text: str):
+        with self._cond:
+            self._parts.append(text)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[Exception] = None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self, seen_parts: int, timeout: float):
+        """Block until more text than `seen_parts` chunks arrives or the turn ends
+
+        Returns (parts received, text, done).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._parts) > seen_parts or self.done, timeout)
+            return len(self._parts), "".join(self._parts), self.done
+
+
+def _generate(turn: Turn, client, request: dict, on_complete: Optional[Callable[[str], None]]):
+    trace = turn.trace
+    start = time.perf_counter()
+    try:
+        with client.messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                if "llm_ttft" not in trace.spans:
+                    trace.mark("llm_ttft", start)
+                turn.feed(text)
+            final_message = stream.get_final_message()
+        trace.mark("llm_total", start)
+        trace.record_usage(final_message.usage, request.get("model"))
+        # Persist here so the reply is kept even if the browser never comes back for it
+        if on_complete is not None:
+            with trace.span("queue_message"):
+                on_complete(turn.text)
+        turn.finish()
+    except Exception as e:
+        turn.finish(e)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool that runs LLM calls"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TURN_WORKERS, thread_name_prefix="turn")
+        return _executor
+
+
+def start_turn(client, trace: TurnTrace, on_complete: Optional[Callable[[str], None]] = None,
+               conversation_id=None, **request) -> Turn:
+    """Start streaming a Messages API reply in the background and make it the session's active turn
+
+    `on_complete(text)` runs in the worker once the reply is complete.
+    """
+    turn = Turn(trace, conversation_id)
+    st.session_state.active_turn = turn
+    get_executor().submit(_generate, turn, client, request, on_complete)
+    return turn
+
+
+def follow_turn(turn: Turn, placeholder) -> str:
+    """Render a turn into `placeholder` as it arrives and return the full reply
+
+    Raises the turn's error if generation failed.
+    """
+    seen = -1
+    while True:
+        parts, text, done = turn.wait(max(seen, 0), RENDER_INTERVAL)
+        if parts != seen or done:
+            with turn.trace.span("render"):
+                placeholder.markdown(text if done else text + CURSOR)
+            seen = parts
+        if done:
+            break
+    if turn.error is not None:
+        raise turn.error
+    return text
+
+
+def end_turn(turn: Turn):
+    """Forget the session's active turn once its reply has been shown"""
+    if st.session_state.get("active_turn") is turn:
+        del st.session_state.active_turn
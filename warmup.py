@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from llm_scheduler import BACKGROUND
+from model_router import FAST_MODEL, is_cacheable
+
+# Set WARMUP=0 to skip background warm-up (e.g. when benchmarking cold starts)
+WARMUP_ENABLED = os.getenv("WARMUP", "1") == "1"
+# Anthropic's prompt cache lives 5 minutes from last use; re-prime a little before that
+PROMPT_CACHE_TTL = 270
+# Models whose prompt cache is primed on session start (comma separated; empty disables)
+WARMUP_MODELS = [model for model in os.getenv("WARMUP_MODELS", FAST_MODEL).split(",") if model]
+
+
+def cached_system(model: str, prompt: str, *extra: str) -> List[Dict]:
+    """System blocks with the (stable) persona prompt marked for prompt caching
+
+    Per-turn additions such as recalled memories go in later blocks, after
+    the cache breakpoint, so they do not invalidate the cached prefix. A
+    prompt shorter than `model`'s minimum cacheable prefix is left unmarked.
+    """
+    blocks = [{"type": "text", "text": prompt}]
+    if is_cacheable(prompt, model):
+        blocks[0]["cache_control"] = {"type": "ephemeral"}
+    blocks.extend({"type": "text", "text": text} for text in extra if text)
+    return blocks
+
+
+class _WarmState:
+    """What has been warmed in this process, and how long each step took"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.done: Dict[str, float] = {}
+        self.running = set()
+        self.primed: Dict[tuple, float] = {}
+        self.errors: Dict[str, str] = {}
+
+
+_state = _WarmState()
+
+
+def _run_in_background(name: str, fn: Callable, ctx) -> Future:
+    future = Future()
+
+    def run():
+        start = time.perf_counter()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            _state.errors[name] = str(e)
+            future.set_exception(e)
+        finally:
+            with _state.lock:
+                _state.running.discard(name)
+                _state.done[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    thread = threading.Thread(target=run, name=f"warmup-{name}", daemon=True)
+    if ctx is not None:
+        # Lets cached resources and cache_data work from the thread like in the script
+        add_script_run_ctx(thread, ctx)
+    thread.start()
+    return future
+
+
+def warm_process(tasks: Dict[str, Callable]):
+    """Run each process-wide warm-up task (client, storage, personality, audio) once, in the background"""
+    if not WARMUP_ENABLED:
+        return
+    ctx = get_script_run_ctx()
+    for name, fn in tasks.items():
+        with _state.lock:
+            if name in _state.done or name in _state.running:
+                continue
+            _state.running.add(name)
+        _run_in_background(name, fn, ctx)
+
+
+def prime_prompt_cache(get_client: Callable, prompt: str, models: List[str] = WARMUP_MODELS):
+    """Write the system prompt into the API prompt cache with a 1-token request per model
+
+    Skipped for a model primed with the same prompt within the cache TTL, and
+    for one whose minimum cacheable prefix the prompt does not reach (the
+    request would only be billed). The call also opens the HTTPS connection
+    the first real turn will reuse. The client is built in the background
+    too, keeping the SDK import off the page.
+    """
+    if not WARMUP_ENABLED:
+        return
+    ctx = get_script_run_ctx()
+    for model in models:
+        if not is_cacheable(prompt, model):
+            continue
+        key = (model, prompt)
+        with _state.lock:
+            if time.monotonic() - _state.primed.get(key, -PROMPT_CACHE_TTL) < PROMPT_CACHE_TTL:
+                continue
+            _state.primed[key] = time.monotonic()
+
+        def prime(model=model):
+            return get_client().messages.create(
+                priority=BACKGROUND,
+                model=model,
+                max_tokens=1,
+                system=cached_system(model, prompt),
+                messages=[{"role": "user", "content": "Hi"}],
+            )
+
+        _run_in_background(f"prompt_cache:{model}", prime, ctx)
+
+
+def prefetch(name: str, fn: Callable):
+    """Start loading a per-session value in the background during the first render"""
+    if not WARMUP_ENABLED:
+        return
+    prefetched = st.session_state.setdefault("prefetched", {})
+    if name not in prefetched:
+        prefetched[name] = _run_in_background(name, fn, get_script_run_ctx())
+
+
+def take_prefetched(name: str, fallback: Callable, timeout: float = 5.0):
+    """The prefetched value if it loaded, else `fallback()`"""
+    future: Optional[Future] = st.session_state.get("prefetched", {}).pop(name, None)
+    if future is not None:
+        try:
+            return future.result(timeout)
+        except Exception:
+            pass
+    return fallback()
+
+
+def warmup_status() -> Dict:
+    with _state.lock:
+        return {"done_ms": dict(_state.done), "running": sorted(_state.running), "errors": dict(_state.errors)}